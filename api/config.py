@@ -1,4 +1,5 @@
 import os
+from functools import lru_cache
 from typing import Optional, Dict, Any
 
 
@@ -25,7 +26,8 @@ class Config:
     STRIPE_CANCEL_URL = "https://ycg-frontend.vercel.app/payment-cancel.html"
 
     # API configurations
-    OPENAI_MODELS = ["gpt-4.1-mini", "gpt-4o"]
+    OPENAI_MODELS = ["gpt-4.1", "gpt-4.1-mini"]  # Primary first, then fallback
+    OPENAI_MAX_INPUT_TOKENS = 100_000  # Transcript token budget per chapter generation request
     # Language codes in order of preference (English first, then other languages)
     TRANSCRIPT_LANGUAGES = [
         # English (various locales)
@@ -57,9 +59,17 @@ class Config:
     REDIS_POOL_SIZE = 10
     REDIS_MAX_CONNECTIONS = 20
 
+    # In-process chapter cache (each entry holds a full transcript, so keep it modest)
+    CHAPTERS_CACHE_MAX_SIZE = int(os.environ.get("CHAPTERS_CACHE_MAX_SIZE", 256))
+
+    # Write logs from a background thread. Off by default: on serverless the thread can
+    # be frozen between invocations and records still queued at shutdown are lost
+    LOG_QUEUE_ENABLED = os.environ.get("LOG_QUEUE_ENABLED", "false").lower() == "true"
+
     # Rate limiting
     RATE_LIMIT_REQUESTS = 100
     RATE_LIMIT_WINDOW = 60  # seconds
+    WEBHOOK_RATE_LIMIT_REQUESTS = 300  # Stripe webhook events accepted per window, across all instances
 
     # Credit plans
     FREE_CREDITS = 3
@@ -75,8 +85,9 @@ class Config:
     DECODO_PORT = 7000
 
     @classmethod
+    @lru_cache(maxsize=1)
     def get_proxy_url(cls) -> Optional[str]:
-        """Get proxy URL if Decodo credentials are available"""
+        """Get proxy URL if Decodo credentials are available (read once; credentials don't change at runtime)"""
         if cls.DECODO_USERNAME and cls.DECODO_PASSWORD:
             return f"http://{cls.DECODO_USERNAME}:{cls.DECODO_PASSWORD}@{cls.DECODO_HOST}:{cls.DECODO_PORT}"
         return None
@@ -9,11 +9,41 @@ from api.routes.auth import router as auth_router
 from api.routes.credits import router as credits_router
 from api.routes.payment import router as payment_router
 from api.errors import register_exception_handlers
+from api.services.oauth_service import close_http_client
+from api.services.youtube import close_http_clients as close_youtube_http_clients
+from api.utils.db import close_redis_connection
+from api.config import Config
 from fastapi.middleware.cors import CORSMiddleware
 import os
 import logging
+import queue
+from contextlib import asynccontextmanager
+from logging.handlers import QueueHandler, QueueListener
 
-app = FastAPI()
+def _start_log_queue() -> QueueListener:
+    """
+    Hands log records to a background thread so a burst of errors (e.g.
+    YouTube throttling) never blocks the event loop on stdout writes.
+    """
+    log_queue = queue.SimpleQueue()
+    root_logger = logging.getLogger()
+    listener = QueueListener(log_queue, *(root_logger.handlers or [logging.StreamHandler()]), respect_handler_level=True)
+    root_logger.handlers = [QueueHandler(log_queue)]
+    listener.start()
+    return listener
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    log_listener = _start_log_queue() if Config.LOG_QUEUE_ENABLED else None
+    yield
+    # Close shared clients so their pooled connections aren't left open
+    await close_http_client()
+    await close_youtube_http_clients()
+    await close_redis_connection()
+    if log_listener is not None:
+        log_listener.stop()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -3,8 +3,8 @@ from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel, constr
 from ..utils.responses import success_response
-from ..utils.cache import get_from_cache, add_to_cache
-from ..services.youtube import fetch_transcript
+from ..utils.cache import get_from_cache, add_to_cache, get_or_compute
+from ..services.youtube import get_transcript
 from ..services.openai_service import create_chapter_prompt, create_final_reminder, generate_chapters_with_openai
 from ..utils.transcript import format_transcript_for_model
 from ..services import credits_service
@@ -14,6 +14,7 @@ from ..models.user import User
 
 LOCK_TTL_SECONDS = 120
 LOCK_PREFIX = "chaptergen-lock:"
+TRANSCRIPT_TIMEOUT_SECONDS = 45
 
 async def acquire_chapter_lock(redis, key: str, ttl: int = LOCK_TTL_SECONDS):
     # SET key value NX EX ttl
@@ -22,6 +23,33 @@ async def acquire_chapter_lock(redis, key: str, ttl: int = LOCK_TTL_SECONDS):
 async def release_chapter_lock(redis, key: str):
     await redis.delete(key)
 
+async def generate_chapters_for_video(video_id: str):
+    """
+    Fetches the transcript, generates chapters with OpenAI and caches both.
+
+    Returns:
+        Tuple of (chapters, transcript_data)
+    """
+    logging.info(f"Attempting to fetch transcript for {video_id} with timeout {TRANSCRIPT_TIMEOUT_SECONDS}s")
+    transcript_data = await get_transcript(video_id, TRANSCRIPT_TIMEOUT_SECONDS)
+    if not transcript_data:
+        logging.error(f"Failed to fetch transcript for {video_id}")
+        raise HTTPException(status_code=500, detail="Failed to fetch transcript after multiple attempts")
+
+    formatted_transcript, _ = format_transcript_for_model(transcript_data)
+    last_entry = transcript_data[-1]
+    video_duration_seconds = last_entry['start'] + last_entry['duration']
+    video_duration_minutes = video_duration_seconds / 60
+    system_prompt = create_chapter_prompt(video_duration_minutes)
+    chapters = await generate_chapters_with_openai(system_prompt, video_id, formatted_transcript, video_duration_minutes)
+
+    if not chapters:
+        logging.error(f"Failed to generate chapters with OpenAI for {video_id}")
+        raise HTTPException(status_code=500, detail="Failed to generate chapters with OpenAI")
+
+    await add_to_cache(video_id, chapters, transcript_data)
+    return chapters, transcript_data
+
 router = APIRouter()
 
 class GenerateChaptersRequest(BaseModel):
@@ -51,9 +79,9 @@ async def generate_chapters(body: GenerateChaptersRequest, user: User = Depends(
     lock_key = f"{LOCK_PREFIX}{video_id}:{user.id}"
     logging.info(f"[CHAPTERS-DEBUG] generate_chapters called for video_id={video_id}, user_id={user.id}, force={body.force}")
 
-    cache_obj = get_from_cache(video_id)
+    cache_obj = await get_from_cache(video_id)
     # If force regenerate and cached transcript exists, skip lock and transcript fetching
-    if body.force and cache_obj and cache_obj.get('transcript'):
+    if body.force and cache_obj and cache_obj.transcript:
         # First check if this would be a free regeneration
         can_regenerate_free = await credits_service.can_regenerate_for_free(user.id, video_id)
         current_count = await credits_service.get_video_generation_count(user.id, video_id)
@@ -74,7 +102,7 @@ async def generate_chapters(body: GenerateChaptersRequest, user: User = Depends(
                 logging.warning(f"User {user.id} attempted regeneration with insufficient credits for video {video_id}")
                 raise HTTPException(status_code=402, detail="Insufficient credits to regenerate chapters")
 
-        transcript_data = cache_obj['transcript']
+        transcript_data = cache_obj.transcript
         logging.info(f"[CHAPTERS-DEBUG] Using cached transcript for {video_id} (User: {user.id})")
         # Rebuild prompt as in initial generation
         formatted_transcript, _ = format_transcript_for_model(transcript_data)
@@ -99,7 +127,7 @@ async def generate_chapters(body: GenerateChaptersRequest, user: User = Depends(
         except Exception as e:
             logging.error(f"Exception during credit deduction for user {user.id} video {video_id}: {e}")
 
-        add_to_cache(video_id, chapters, transcript_data)
+        await add_to_cache(video_id, chapters, transcript_data)
         parsed_chapters, formatted_text = parse_chapters_text(chapters)
 
         # Get remaining generations
@@ -149,9 +177,9 @@ async def generate_chapters(body: GenerateChaptersRequest, user: User = Depends(
 
         # Return cached chapters if available and not forcing regeneration
         if not body.force:
-            if cache_obj and cache_obj.get('chapters'):
+            if cache_obj and cache_obj.chapters:
                 logging.info(f"Returning cached chapters for {video_id} (User: {user.id})")
-                parsed_chapters, formatted_text = parse_chapters_text(cache_obj['chapters'])
+                parsed_chapters, formatted_text = parse_chapters_text(cache_obj.chapters)
                 # Get current generation count and remaining generations
                 current_count = await credits_service.get_video_generation_count(user.id, video_id)
                 remaining_generations = await credits_service.get_remaining_generations(user.id, video_id)
@@ -166,24 +194,16 @@ async def generate_chapters(body: GenerateChaptersRequest, user: User = Depends(
                     'creditsUsed': 0  # No credits used for cached response
                 })
 
-        # Get transcript and format it
-        timeout_limit = 45
-        logging.info(f"Attempting to fetch transcript for {video_id} with timeout {timeout_limit}s (User: {user.id})")
-        transcript_data = fetch_transcript(video_id, timeout_limit)
-        if not transcript_data:
-            logging.error(f"Failed to fetch transcript for {video_id} (User: {user.id})")
-            raise HTTPException(status_code=500, detail="Failed to fetch transcript after multiple attempts")
-
-        formatted_transcript, _ = format_transcript_for_model(transcript_data)
-        last_entry = transcript_data[-1]
-        video_duration_seconds = last_entry['start'] + last_entry['duration']
-        video_duration_minutes = video_duration_seconds / 60
-        system_prompt = create_chapter_prompt(video_duration_minutes)
-        chapters = await generate_chapters_with_openai(system_prompt, video_id, formatted_transcript, video_duration_minutes)
-
-        if not chapters:
-            logging.error(f"Failed to generate chapters with OpenAI for {video_id} (User: {user.id})")
-            raise HTTPException(status_code=500, detail="Failed to generate chapters with OpenAI")
+        # Get transcript and generate chapters. Concurrent requests for the same
+        # video (e.g. a trending one, from different users) share one transcript
+        # fetch and one OpenAI call instead of each paying for their own. A forced
+        # regeneration is paid for separately, so it never joins another request's
+        # in-flight result.
+        logging.info(f"Generating chapters for {video_id} (User: {user.id})")
+        if body.force:
+            chapters, _ = await generate_chapters_for_video(video_id)
+        else:
+            chapters, _ = await get_or_compute(video_id, lambda: generate_chapters_for_video(video_id))
 
         # Increment generation count first
         new_count = await credits_service.increment_video_generation_count(user.id, video_id)
@@ -197,7 +217,6 @@ async def generate_chapters(body: GenerateChaptersRequest, user: User = Depends(
         except Exception as e:
             logging.error(f"Exception during credit deduction for user {user.id} video {video_id}: {e}")
 
-        add_to_cache(video_id, chapters, transcript_data)
         parsed_chapters, formatted_text = parse_chapters_text(chapters)
 
         # Get remaining generations
@@ -66,11 +66,17 @@ async def webhook(request: Request):
     except stripe.error.SignatureVerificationError as e:
         logging.error(f"Invalid Stripe signature: {e}")
         return error_response("Invalid signature", 400)
+    # Shed bursts before doing any work; Stripe retries 429s with backoff
+    if not await payment_service.allow_webhook_event():
+        logging.warning(f"Webhook rate limit exceeded, deferring event {event['id']}")
+        return error_response("Too many webhook events", 429)
     # Pass event to service
     try:
         await payment_service.handle_webhook_event(event)
     except Exception as e:
         logging.error(f"Error handling webhook event: {e}")
+        # Non-2xx so Stripe redelivers the event (its claim was released)
+        return error_response("Error handling webhook event", 500)
     return success_response({"received": True})
 
 @router.get('/purchases')
@@ -1,9 +1,10 @@
 import logging
-import json
 import datetime
-from typing import Optional
+from typing import List, Optional, Sequence
 
-from ..utils.db import redis_operation
+import orjson
+
+from ..utils.db import redis_operation, redis_pipeline
 # User model import removed - will be added back when needed
 
 # Constants for credit plans (can be moved to config if needed)
@@ -18,6 +19,13 @@ MAX_TOTAL_GENERATIONS = 6  # Maximum total generations (initial + 5 regeneration
 CREDIT_BALANCE_KEY_PREFIX = "credits:"
 TRANSACTION_LOG_KEY_PREFIX = "transactions:" # Using a Redis List for transaction log
 VIDEO_GENERATIONS_KEY_PREFIX = "video_generations:"  # Track generations per video per user
+PURCHASE_INDEX_KEY_PREFIX = "purchases:"  # Sorted set of purchase transactions scored by timestamp
+PURCHASE_INDEX_READY_KEY_PREFIX = "purchases_indexed:"  # Set once a user's older purchases are in the index
+
+# Transaction types that count as purchases (indexed separately for purchase history)
+PURCHASE_TRANSACTION_TYPES = ("purchase", "subscription_renewal")
+MAX_STORED_TRANSACTIONS = 1000
+TRANSACTION_SCAN_CHUNK_SIZE = 100  # Log entries fetched per LRANGE when filtering by type
 
 async def initialize_credits(user_id: str):
     """Sets the initial free credits for a new user."""
@@ -46,7 +54,7 @@ async def get_credit_balance(user_id: str) -> int:
         logging.info(f"[DEBUG] get_credit_balance: Redis key={key}, raw value={balance}")
         return int(balance) if balance is not None else 0
 
-    return await redis_operation("get_credit_balance", _get_balance, user_id)
+    return await redis_operation("get_credit_balance", _get_balance, user_id, idempotent=True)
 
 async def has_sufficient_credits(user_id: str, amount_needed: int = DEFAULT_GENERATION_COST) -> bool:
     """
@@ -100,7 +108,7 @@ async def deduct_credits(user_id: str, amount: int = DEFAULT_GENERATION_COST, de
             "type": "deduction",
             "description": description
         }
-        await redis.lpush(transaction_key, json.dumps(transaction_data))
+        await redis.lpush(transaction_key, orjson.dumps(transaction_data).decode())
 
         return True
 
@@ -119,25 +127,29 @@ async def add_credits(user_id: str, amount: int, transaction_type: str = "purcha
 
     key = f"{CREDIT_BALANCE_KEY_PREFIX}{user_id}"
 
-    async def _add_credits(redis, user_id, amount, transaction_type, description):
-        # Add the credits
-        new_balance = await redis.incrby(key, amount)
-        logging.info(f"Added {amount} credits to user {user_id}. New balance: {new_balance}")
-
-        # Log the transaction (using the same redis connection)
-        transaction_key = f"{TRANSACTION_LOG_KEY_PREFIX}{user_id}"
-        transaction_data = {
-            "timestamp": datetime.datetime.now().isoformat(),
-            "amount": amount,
-            "type": transaction_type,
-            "description": description
-        }
-        await redis.lpush(transaction_key, json.dumps(transaction_data))
-
-        return new_balance
+    transaction_key = f"{TRANSACTION_LOG_KEY_PREFIX}{user_id}"
+    purchase_key = f"{PURCHASE_INDEX_KEY_PREFIX}{user_id}"
+    now = datetime.datetime.now()
+    transaction_data = {
+        "timestamp": now.isoformat(),
+        "amount": amount,
+        "type": transaction_type,
+        "description": description
+    }
+    transaction_json = orjson.dumps(transaction_data).decode()
 
     try:
-        return await redis_operation("add_credits", _add_credits, user_id, amount, transaction_type, description)
+        # The balance, the log and the purchase index change together or not at all
+        async with redis_pipeline("add_credits", transaction=True) as pipe:
+            pipe.incrby(key, amount)
+            pipe.lpush(transaction_key, transaction_json)
+            # Index purchases by time so purchase history doesn't scan the whole log
+            if transaction_type in PURCHASE_TRANSACTION_TYPES:
+                pipe.zadd(purchase_key, {transaction_json: now.timestamp()})
+                pipe.zremrangebyrank(purchase_key, 0, -(MAX_STORED_TRANSACTIONS + 1))
+        new_balance = int(pipe.results[0])
+        logging.info(f"Added {amount} credits to user {user_id}. New balance: {new_balance}")
+        return new_balance
     except Exception as e:
         logging.error(f"Error adding credits for user {user_id}: {e}")
         return None
@@ -153,9 +165,9 @@ async def add_transaction(user_id: str, amount: int, type: str, description: str
             "description": description
         }
         # LPUSH adds to the beginning of the list
-        await redis.lpush(key, json.dumps(transaction_data))
+        await redis.lpush(key, orjson.dumps(transaction_data).decode())
         # Trim the list to keep only the last N transactions
-        await redis.ltrim(key, 0, 999)  # Keep latest 1000 transactions
+        await redis.ltrim(key, 0, MAX_STORED_TRANSACTIONS - 1)  # Keep latest 1000 transactions
         return True
 
     try:
@@ -171,16 +183,104 @@ async def get_transactions(user_id: str, offset: int = 0, limit: int = 20):
         start = offset
         end = offset + limit - 1
         transactions_json = await redis.lrange(key, start, end)
-        transactions = [json.loads(t) for t in transactions_json]
+        transactions = [orjson.loads(t) for t in transactions_json]
         total = await redis.llen(key)
         return transactions, total
 
     try:
-        return await redis_operation("get_transactions", _get_transactions, user_id, offset, limit)
+        return await redis_operation("get_transactions", _get_transactions, user_id, offset, limit, idempotent=True)
     except Exception as e:
         logging.error(f"Failed to retrieve transactions for user {user_id}: {e}")
         return [], 0
 
+async def get_transactions_page(user_id: str, offset: int = 0, limit: int = 20, types: Optional[Sequence[str]] = None) -> List[dict]:
+    """
+    Retrieves a page of a user's transactions, newest first, optionally filtered by type.
+
+    Exactly the purchase types are served from the purchase index with a single
+    ZRANGE; the first such read for a user copies their older purchases from the log into the
+    index, so every page after that, at any offset, comes from the index. Without a
+    filter the page is a single LRANGE. Other filters walk the transaction log in
+    chunks until the page is full; a rare type can mean reading most of the log, so
+    the walk stops after the newest MAX_STORED_TRANSACTIONS entries (the length
+    the log is trimmed to) and older matches are not returned. A subset of the
+    purchase types is such a filter too, since the index holds both types.
+
+    Args:
+        user_id: The user ID
+        offset: Number of matching transactions to skip
+        limit: Maximum number of transactions to return
+        types: Transaction types to include, or None for all types
+
+    Returns:
+        List of transaction records
+    """
+    type_filter = set(types) if types is not None else None
+    purchase_key = f"{PURCHASE_INDEX_KEY_PREFIX}{user_id}"
+    ready_key = f"{PURCHASE_INDEX_READY_KEY_PREFIX}{user_id}"
+    log_key = f"{TRANSACTION_LOG_KEY_PREFIX}{user_id}"
+
+    async def _get_page(redis, _, offset, limit):
+        if type_filter == set(PURCHASE_TRANSACTION_TYPES):
+            pipe = redis.pipeline()
+            pipe.exists(ready_key)
+            pipe.zrange(purchase_key, offset, offset + limit - 1, rev=True)
+            ready, indexed = await pipe.exec()
+            if not ready:
+                # Purchases made before the index existed are only in the log
+                await _backfill_purchase_index(redis, log_key, purchase_key, ready_key)
+                indexed = await redis.zrange(purchase_key, offset, offset + limit - 1, rev=True)
+            return [orjson.loads(t) for t in indexed]
+
+        if type_filter is None:
+            page = await redis.lrange(log_key, offset, offset + limit - 1)
+            return [orjson.loads(t) for t in page]
+
+        page = []
+        skipped = 0
+        start = 0
+        while len(page) < limit and start < MAX_STORED_TRANSACTIONS:
+            chunk = await redis.lrange(log_key, start, start + TRANSACTION_SCAN_CHUNK_SIZE - 1)
+            for transaction_json in chunk:
+                transaction = orjson.loads(transaction_json)
+                if transaction["type"] not in type_filter:
+                    continue
+                if skipped < offset:
+                    skipped += 1
+                    continue
+                page.append(transaction)
+                if len(page) == limit:
+                    break
+            if len(chunk) < TRANSACTION_SCAN_CHUNK_SIZE:
+                break
+            start += TRANSACTION_SCAN_CHUNK_SIZE
+        return page
+
+    return await redis_operation("get_transactions_page", _get_page, user_id, offset, limit, idempotent=True)
+
+async def _backfill_purchase_index(redis, log_key: str, purchase_key: str, ready_key: str) -> None:
+    """
+    Copies the purchases in a user's transaction log into the purchase index, once.
+
+    Members are the log's own JSON strings, so purchases add_credits already indexed
+    are overwritten rather than duplicated and running this twice is harmless.
+    """
+    purchases = {}
+    for transaction_json in await redis.lrange(log_key, 0, MAX_STORED_TRANSACTIONS - 1):
+        transaction = orjson.loads(transaction_json)
+        if transaction.get("type") in PURCHASE_TRANSACTION_TYPES:
+            timestamp = transaction.get("timestamp")
+            score = datetime.datetime.fromisoformat(timestamp).timestamp() if timestamp else 0
+            purchases[transaction_json] = score
+
+    pipe = redis.pipeline()
+    if purchases:
+        pipe.zadd(purchase_key, purchases)
+        pipe.zremrangebyrank(purchase_key, 0, -(MAX_STORED_TRANSACTIONS + 1))
+    pipe.set(ready_key, 1)
+    await pipe.exec()
+    logging.info(f"Backfilled {len(purchases)} purchases into {purchase_key}")
+
 async def get_video_generation_count(user_id: str, video_id: str) -> int:
     """
     Get the number of times a user has generated chapters for a specific video.
@@ -199,7 +299,7 @@ async def get_video_generation_count(user_id: str, video_id: str) -> int:
         return int(count) if count is not None else 0
 
     try:
-        return await redis_operation("get_video_generation_count", _get_count, user_id)
+        return await redis_operation("get_video_generation_count", _get_count, user_id, idempotent=True)
     except Exception as e:
         logging.error(f"Failed to get generation count for user {user_id}, video {video_id}: {e}")
         return 0
@@ -217,14 +317,13 @@ async def increment_video_generation_count(user_id: str, video_id: str) -> int:
     """
     key = f"{VIDEO_GENERATIONS_KEY_PREFIX}{user_id}:{video_id}"
 
-    async def _increment_count(redis, _):
-        new_count = await redis.incr(key)
-        # Set expiry to 30 days to avoid keeping this data forever
-        await redis.expire(key, 60 * 60 * 24 * 30)
-        return int(new_count)
-
     try:
-        return await redis_operation("increment_video_generation_count", _increment_count, user_id)
+        # One round trip for both commands
+        async with redis_pipeline("increment_video_generation_count") as pipe:
+            pipe.incr(key)
+            # Set expiry to 30 days to avoid keeping this data forever
+            pipe.expire(key, 60 * 60 * 24 * 30)
+        return int(pipe.results[0])
     except Exception as e:
         logging.error(f"Failed to increment generation count for user {user_id}, video {video_id}: {e}")
         return 0
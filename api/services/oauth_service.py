@@ -12,6 +12,32 @@ from google.auth.transport import requests
 from ..config import Config
 from ..utils.exceptions import AuthenticationError
 
+# Shared client for Google API calls so sign-ins reuse pooled keep-alive
+# connections instead of paying DNS + TCP + TLS setup on every request.
+# Timeouts are passed per request.
+GOOGLE_HTTP_LIMITS = httpx.Limits(max_keepalive_connections=20, max_connections=100)
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def _get_http_client() -> httpx.AsyncClient:
+    """
+    Returns the shared httpx client, creating it on first use.
+    """
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(limits=GOOGLE_HTTP_LIMITS)
+    return _http_client
+
+
+async def close_http_client() -> None:
+    """
+    Closes the shared httpx client. Called on application shutdown.
+    """
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
 
 async def verify_google_oauth_token(token: str, timeout: int = 15) -> Dict[str, Any]:
     """
@@ -36,26 +62,26 @@ async def verify_google_oauth_token(token: str, timeout: int = 15) -> Dict[str,
     logging.info(f"Verifying Google OAuth token (prefix: {token_prefix}...) using userinfo endpoint")
 
     try:
-        async with httpx.AsyncClient(timeout=timeout) as client:
-            logging.info(f"Sending request to {userinfo_url}")
-            response = await client.get(userinfo_url, headers=headers)
-            response.raise_for_status()
-            logging.info(f"Google userinfo response status: {response.status_code}")
+        client = _get_http_client()
+        logging.info(f"Sending request to {userinfo_url}")
+        response = await client.get(userinfo_url, headers=headers, timeout=timeout)
+        response.raise_for_status()
+        logging.info(f"Google userinfo response status: {response.status_code}")
+        
+        user_info = response.json()
+        
+        # Validate required fields
+        if not user_info.get("sub") or not user_info.get("email"):
+            logging.error("Google user info missing required fields")
+            raise AuthenticationError("Google user info missing required fields")
             
-            user_info = response.json()
+        # Verify email is verified
+        if not user_info.get("email_verified"):
+            logging.warning(f"Unverified email from Google: {user_info.get('email')}")
+            raise AuthenticationError("Email not verified with Google")
             
-            # Validate required fields
-            if not user_info.get("sub") or not user_info.get("email"):
-                logging.error("Google user info missing required fields")
-                raise AuthenticationError("Google user info missing required fields")
-                
-            # Verify email is verified
-            if not user_info.get("email_verified"):
-                logging.warning(f"Unverified email from Google: {user_info.get('email')}")
-                raise AuthenticationError("Email not verified with Google")
-                
-            logging.info(f"Successfully verified Google OAuth token for email: {user_info.get('email')}")
-            return user_info
+        logging.info(f"Successfully verified Google OAuth token for email: {user_info.get('email')}")
+        return user_info
             
     except httpx.RequestError as e:
         logging.error(f"Error connecting to Google API: {e}")
@@ -114,14 +140,14 @@ async def revoke_google_token(token: str, timeout: int = 10) -> bool:
     """
     revoke_url = "https://oauth2.googleapis.com/revoke"
     try:
-        async with httpx.AsyncClient(timeout=timeout) as client:
-            response = await client.post(revoke_url, params={"token": token}, headers={"Content-Type": "application/x-www-form-urlencoded"})
-            if response.status_code == 200:
-                logging.info("Google token revoked successfully.")
-                return True
-            else:
-                logging.warning(f"Failed to revoke Google token. Status: {response.status_code}, Response: {response.text}")
-                return False
+        client = _get_http_client()
+        response = await client.post(revoke_url, params={"token": token}, headers={"Content-Type": "application/x-www-form-urlencoded"}, timeout=timeout)
+        if response.status_code == 200:
+            logging.info("Google token revoked successfully.")
+            return True
+        else:
+            logging.warning(f"Failed to revoke Google token. Status: {response.status_code}, Response: {response.text}")
+            return False
     except Exception as e:
         logging.error(f"Error revoking Google token: {e}")
         return False
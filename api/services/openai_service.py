@@ -3,14 +3,22 @@ OpenAI API integration service
 """
 import traceback
 import os
+import logging
+import sys
+import time
+import math
 from typing import Dict, Any, Optional, List
 from openai import OpenAI, AsyncOpenAI
 import openai  # For logging
 from api.config import Config
 
+logger = logging.getLogger(__name__)
 
-# Enable OpenAI debug logging for full request/response logs
-openai.log = "debug"
+
+# Full request/response logging formats every prompt and completion; only enable it on demand
+OPENAI_DEBUG = os.getenv("OPENAI_DEBUG") == "1"
+openai.log = "debug" if OPENAI_DEBUG else "warning"
+logging.getLogger("openai").setLevel(logging.DEBUG if OPENAI_DEBUG else logging.WARNING)
 
 # Initialize OpenAI clients
 openai_client = None
@@ -30,6 +38,52 @@ else:
 if async_openai_client is None:
     print("CRITICAL: async_openai_client is still None after initialization!")
 
+# Tokenizer for transcript budgeting; building the encoder is expensive, so do it once at import
+try:
+    import tiktoken
+    _token_encoding = tiktoken.get_encoding("o200k_base")  # Encoding used by gpt-4o / gpt-4.1
+except Exception as e:
+    logger.warning("tiktoken unavailable, estimating transcript tokens from length: %s", e)
+    _token_encoding = None
+
+# Rough characters-per-token ratio used when tiktoken is not available
+CHARS_PER_TOKEN_ESTIMATE = 4
+
+
+def trim_transcript_to_token_budget(formatted_transcript: str, max_tokens: int = Config.OPENAI_MAX_INPUT_TOKENS) -> str:
+    """
+    Bound the transcript size sent to the model.
+
+    Over-budget transcripts are down-sampled by keeping every K-th line, so the
+    whole video stays covered, then hard-capped if still too long.
+
+    Args:
+        formatted_transcript: Formatted transcript text (one timestamped line per entry)
+        max_tokens: Maximum number of transcript tokens to send
+
+    Returns:
+        The transcript, unchanged if it already fits the budget
+    """
+    if _token_encoding:
+        token_count = len(_token_encoding.encode(formatted_transcript))
+    else:
+        token_count = len(formatted_transcript) // CHARS_PER_TOKEN_ESTIMATE
+    if token_count <= max_tokens:
+        return formatted_transcript
+
+    keep_every = math.ceil(token_count / max_tokens)
+    logger.info("Transcript has ~%d tokens (budget %d), keeping every %dth line", token_count, max_tokens, keep_every)
+    trimmed = "\n".join(formatted_transcript.splitlines()[::keep_every])
+
+    # Line lengths vary, so down-sampling is approximate; hard-cap whatever still exceeds the budget
+    if _token_encoding:
+        tokens = _token_encoding.encode(trimmed)
+        if len(tokens) > max_tokens:
+            trimmed = _token_encoding.decode(tokens[:max_tokens])
+    else:
+        trimmed = trimmed[:max_tokens * CHARS_PER_TOKEN_ESTIMATE]
+    return trimmed
+
 def create_chapter_prompt(video_duration_minutes: float) -> str:
     """
     Create a flexible prompt for generating chapter titles based on natural content transitions.
@@ -161,20 +215,17 @@ async def generate_chapters_with_openai(system_prompt: str, video_id: str, forma
     # Create the final reminder using the provided video duration
     final_reminder = create_final_reminder(video_duration_minutes)
 
-    # Model preference: gpt-4.1 as primary, gpt-4.1-mini as secondary
-    models_to_try = [
-        "gpt-4.1",
-        "gpt-4.1-mini",
-    ]
+    # Keep input tokens (cost and time-to-first-token) bounded on very long videos
+    formatted_transcript = trim_transcript_to_token_budget(formatted_transcript)
+
+    # Prepare the input with transcript, system prompt repeat, and final reminder
+    combined_input = f"{formatted_transcript}\n\n---\n\n{system_prompt}\n\n---\n\n{final_reminder}"
 
-    for model in models_to_try:
+    # Model preference: gpt-4.1 as primary, gpt-4.1-mini as secondary
+    for model in Config.OPENAI_MODELS:
         try:
-            import time
             print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] Trying model: {model}, timeout={timeout}s")
 
-            # Prepare the input with transcript, system prompt repeat, and final reminder
-            combined_input = f"{formatted_transcript}\n\n---\n\n{system_prompt}\n\n---\n\n{final_reminder}"
-
             print("[OPENAI-REQUEST] Parameters:", {
                 "model": model,
                 "input": combined_input[:100] + ("..." if len(combined_input) > 100 else ""),
@@ -209,28 +260,30 @@ async def generate_chapters_with_openai(system_prompt: str, video_id: str, forma
             if not chapters:
                 print("No output_text in response, trying another model")
                 continue
-            chapter_lines = chapters.splitlines()
-            if not chapter_lines or len(chapter_lines) < 2:
+            # Check the shape via the first newline so malformed output is rejected
+            # without splitting the whole response into a list
+            first_newline = chapters.find("\n")
+            if first_newline == -1 or not chapters[first_newline + 1:first_newline + 2]:
                 print("Not enough chapters, trying another model")
                 continue
 
             # Check if the first chapter starts at 00:00
-            if not chapter_lines[0].startswith("00:00"):
+            first_line = chapters[:first_newline]
+            if not first_line.startswith("00:00"):
                 print("WARNING: First chapter doesn't start at 00:00, fixing it")
                 # Extract the title from the first chapter
-                first_chapter_parts = chapter_lines[0].split(' ', 1)
+                first_chapter_parts = first_line.split(' ', 1)
                 first_chapter_title = first_chapter_parts[1] if len(first_chapter_parts) > 1 else "Introduction"
 
                 # Replace the first chapter with one that starts at 00:00
-                chapter_lines[0] = f"00:00 {first_chapter_title}"
-                chapters = "\n".join(chapter_lines)
+                chapters = f"00:00 {first_chapter_title}{chapters[first_newline:]}"
 
             # For videos longer than 60 minutes, apply mixed format:
             # - MM:SS for timestamps under 60 minutes
             # - HH:MM:SS for timestamps over 60 minutes
             if video_duration_minutes > 60:
                 fixed_chapter_lines = []
-                for line in chapter_lines:
+                for line in chapters.splitlines():
                     parts = line.split(' ', 1)
                     if len(parts) < 2:
                         fixed_chapter_lines.append(line)
@@ -274,8 +327,6 @@ async def generate_chapters_with_openai(system_prompt: str, video_id: str, forma
             # All basic checks passed
             return chapters
         except Exception as e:
-            import traceback
-            import sys
             print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] Error generating chapters with {model}: {type(e).__name__}")
             print(f"Error details: {str(e)}")
             traceback.print_exc()
@@ -1,13 +1,21 @@
 import logging
 import stripe
 from typing import Dict, Any, Optional, List
-import json
-from datetime import datetime
+import orjson
+import hashlib
+import time
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 
 from ..config import Config
-from ..utils.db import get_redis_connection
+from ..utils.db import get_redis_connection, redis_operation
+from ..utils.exceptions import RedisOperationError
 from . import credits_service
 
+logger = logging.getLogger(__name__)
+
 # Stripe Product/Price mapping for credits
 STRIPE_PRICE_ID_TO_CREDITS = {
     # One-time purchases
@@ -18,13 +26,166 @@ STRIPE_PRICE_ID_TO_CREDITS = {
     'price_1RHh4RF7Kryr2ZRbmHnwUnq4': 50,   # 50 Credits Recurring ($29/month)
 }
 
+# Plans offered to the frontend; "id" is the Stripe Price ID sent back to create-checkout-session
+DEFAULT_PLANS = [
+    {"id": 'price_1RHh4dF7Kryr2ZRbrm1f0zt4', "name": "Basic", "credits": Config.BASIC_PLAN_CREDITS, "price": Config.BASIC_PLAN_PRICE, "mode": "payment"},
+    {"id": 'price_1RHh4RF7Kryr2ZRbL5HZLqj8', "name": "Premium", "credits": Config.PREMIUM_PLAN_CREDITS, "price": Config.PREMIUM_PLAN_PRICE, "mode": "payment"},
+    {"id": 'price_1RHh4dF7Kryr2ZRbZwLlf2bT', "name": "Basic Monthly", "credits": Config.BASIC_PLAN_CREDITS, "price": Config.BASIC_PLAN_PRICE, "mode": "subscription"},
+    {"id": 'price_1RHh4RF7Kryr2ZRbmHnwUnq4', "name": "Premium Monthly", "credits": Config.PREMIUM_PLAN_CREDITS, "price": Config.PREMIUM_PLAN_PRICE, "mode": "subscription"},
+]
+
 # Stripe API key setup
 stripe.api_key = Config.STRIPE_SECRET_KEY
 
 # Redis key prefixes
+PAYMENT_PLANS_KEY = "payment_plans"  # Optional admin override of DEFAULT_PLANS
 CHECKOUT_SESSION_KEY_PREFIX = "checkout:"
+CHECKOUT_IDEMPOTENCY_KEY_PREFIX = "co_idem:"
+WEBHOOK_EVENT_SEEN_KEY_PREFIX = "webhook:seen:"
+WEBHOOK_RATE_KEY_PREFIX = "rate:webhook:"
 
-import asyncio
+# How long a created checkout session is replayed for identical requests (double-click, retry)
+CHECKOUT_IDEMPOTENCY_TTL_SECONDS = 120
+# How long checkout session records are kept for webhook reconciliation
+CHECKOUT_SESSION_TTL_SECONDS = 60 * 60 * 24 * 7
+# Stripe retries failed deliveries for up to 3 days; remember handled events well past that
+WEBHOOK_EVENT_SEEN_TTL_SECONDS = 60 * 60 * 24 * 7
+# Plans change effectively never, so keep them in-process instead of hitting Redis per call
+PAYMENT_PLANS_CACHE_TTL_SECONDS = 300
+
+# Fixed-window counter: INCR and the first EXPIRE run atomically so a bucket can never be left without a TTL
+_RATE_LIMIT_SCRIPT = """
+local count = redis.call('INCR', KEYS[1])
+if count == 1 then
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+end
+return count
+"""
+
+# Cap concurrent Stripe calls so bursts don't exhaust the worker thread pool or trip Stripe's rate limit (429s)
+STRIPE_MAX_CONCURRENT_REQUESTS = 25
+_stripe_semaphore = asyncio.Semaphore(STRIPE_MAX_CONCURRENT_REQUESTS)
+
+# stripe==7.x has no async client; run its blocking calls on a dedicated pool so
+# Stripe bursts can't starve other users of the default executor
+STRIPE_EXECUTOR_WORKERS = 8
+_stripe_executor = ThreadPoolExecutor(max_workers=STRIPE_EXECUTOR_WORKERS, thread_name_prefix="stripe")
+
+_plans_cache: Dict[str, Any] = {"value": None, "by_id": None, "expires": 0.0}
+
+async def _run_stripe(func, *args, **kwargs):
+    """
+    Run a blocking Stripe SDK call on the Stripe executor, bounded by the Stripe semaphore.
+    """
+    loop = asyncio.get_running_loop()
+    async with _stripe_semaphore:
+        return await loop.run_in_executor(_stripe_executor, functools.partial(func, *args, **kwargs))
+
+def _checkout_idempotency_key(user_id: str, price_id: str, mode: str, success_url: str, cancel_url: str) -> str:
+    """
+    Build a deterministic cache key for a checkout request.
+    """
+    raw = f"{user_id}|{price_id}|{mode}|{success_url}|{cancel_url}"
+    return CHECKOUT_IDEMPOTENCY_KEY_PREFIX + hashlib.sha256(raw.encode()).hexdigest()
+
+async def _get_cached_checkout_session(idempotency_key: str) -> Optional[Dict[str, str]]:
+    async def _get(redis):
+        return await redis.get(idempotency_key)
+    try:
+        cached = await redis_operation("get_checkout_idempotency", _get, idempotent=True)
+        return orjson.loads(cached) if cached else None
+    except Exception as e:
+        logger.warning("Could not read checkout idempotency cache: %s", e)
+        return None
+
+async def _store_checkout_session(idempotency_key: str, session_info: Dict[str, str], session_data: Dict[str, Any]) -> None:
+    """
+    Persist the checkout session record and its idempotency entry in a single round trip.
+    """
+    session_key = f"{CHECKOUT_SESSION_KEY_PREFIX}{session_info['id']}"
+
+    async def _set(redis):
+        pipe = redis.pipeline()
+        # Stored as a hash so status updates touch only the changed fields
+        pipe.hset(session_key, values=session_data)
+        pipe.expire(session_key, CHECKOUT_SESSION_TTL_SECONDS)
+        pipe.set(idempotency_key, orjson.dumps(session_info).decode(), ex=CHECKOUT_IDEMPOTENCY_TTL_SECONDS)
+        await pipe.exec()
+        return True
+    try:
+        await redis_operation("store_checkout_session", _set, idempotent=True)
+    except Exception as e:
+        logger.warning("Could not store checkout session %s: %s", session_info['id'], e)
+
+async def _mark_checkout_session_completed(session_id: str) -> None:
+    """
+    Flag a stored checkout session as completed once Stripe confirms it.
+    """
+    session_key = f"{CHECKOUT_SESSION_KEY_PREFIX}{session_id}"
+
+    completed_fields = {"status": "completed", "completed_at": datetime.now(timezone.utc).isoformat()}
+
+    async def _complete(redis):
+        pipe = redis.pipeline()
+        pipe.hset(session_key, values=completed_fields)
+        # Also bounds the lifetime of records for sessions created outside this service
+        pipe.expire(session_key, CHECKOUT_SESSION_TTL_SECONDS)
+        await pipe.exec()
+        return True
+
+    async def _complete_legacy(redis):
+        # Records written before the hash layout are JSON strings (HSET fails with WRONGTYPE)
+        session_data_json = await redis.get(session_key)
+        if not session_data_json:
+            return False
+        session_data = orjson.loads(session_data_json)
+        session_data.update(completed_fields)
+        await redis.set(session_key, orjson.dumps(session_data).decode(), ex=CHECKOUT_SESSION_TTL_SECONDS)
+        return True
+    try:
+        try:
+            await redis_operation("complete_checkout_session", _complete, idempotent=True)
+        except RedisOperationError as e:
+            # Only a string record rejects HSET; after a timeout or lost connection the
+            # hash write may have landed, and a legacy write would clobber it
+            if "WRONGTYPE" not in str(e):
+                raise
+            await redis_operation("complete_checkout_session_legacy", _complete_legacy, idempotent=True)
+    except Exception as e:
+        logger.warning("Could not mark checkout session %s completed: %s", session_id, e)
+
+async def get_payment_plans() -> List[Dict[str, Any]]:
+    """
+    Get the available payment plans.
+    Reads the admin override from Redis (falling back to DEFAULT_PLANS) at most
+    once per PAYMENT_PLANS_CACHE_TTL_SECONDS, so an edited override takes effect
+    on each instance within that window.
+    """
+    if _plans_cache["value"] is not None and time.monotonic() < _plans_cache["expires"]:
+        return _plans_cache["value"]
+
+    async def _get_plans(redis):
+        return await redis.get(PAYMENT_PLANS_KEY)
+
+    plans = DEFAULT_PLANS
+    try:
+        plans_json = await redis_operation("get_payment_plans", _get_plans, idempotent=True)
+        if plans_json:
+            plans = orjson.loads(plans_json)
+    except Exception as e:
+        logger.warning("Could not load payment plans from Redis, using defaults: %s", e)
+
+    _plans_cache["value"] = plans
+    _plans_cache["by_id"] = {p["id"]: p for p in plans}
+    _plans_cache["expires"] = time.monotonic() + PAYMENT_PLANS_CACHE_TTL_SECONDS
+    return plans
+
+async def get_payment_plans_by_id() -> Dict[str, Dict[str, Any]]:
+    """
+    Get the available payment plans indexed by plan ID (the Stripe Price ID).
+    """
+    await get_payment_plans()
+    return _plans_cache["by_id"]
 
 async def create_checkout_session(user_id: str, price_id: str, mode: str, timeout: int = 30):
     """
@@ -37,76 +198,221 @@ async def create_checkout_session(user_id: str, price_id: str, mode: str, timeou
     Returns:
         Stripe Checkout Session dict (id, url) or None if error.
     """
+    plans_by_id = await get_payment_plans_by_id()
+    if price_id not in plans_by_id:
+        # Unknown prices would be charged without crediting the user on the webhook
+        logger.warning("Rejected checkout for unknown price_id %s (user %s)", price_id, user_id)
+        return None
+    plan_mode = plans_by_id[price_id].get("mode", mode)
+    if mode != plan_mode:
+        # A subscription price checked out as a one-time payment (or vice versa) would
+        # be charged once but credited by the wrong webhook branch
+        logger.warning("Rejected checkout for price_id %s with mode %s, plan mode is %s (user %s)", price_id, mode, plan_mode, user_id)
+        return None
+
+    success_url = Config.STRIPE_SUCCESS_URL
+    cancel_url = Config.STRIPE_CANCEL_URL
+    idempotency_key = _checkout_idempotency_key(user_id, price_id, mode, success_url, cancel_url)
+
+    # Replay a session created moments ago for the same request instead of calling Stripe again
+    cached_session = await _get_cached_checkout_session(idempotency_key)
+    if cached_session:
+        logger.info("Returning cached checkout session %s for user %s", cached_session.get('id'), user_id)
+        return cached_session
+
+    # Stripe keeps idempotency keys for 24h, so scope ours to the replay window;
+    # otherwise a repeat purchase later in the day would get the old session back.
+    stripe_idempotency_key = f"{idempotency_key}:{int(time.time() // CHECKOUT_IDEMPOTENCY_TTL_SECONDS)}"
+
     try:
-        async def create_session():
-            return stripe.checkout.Session.create(
-                payment_method_types=["card"],
-                line_items=[{"price": price_id, "quantity": 1}],
-                mode=mode,
-                success_url=Config.STRIPE_SUCCESS_URL,
-                cancel_url=Config.STRIPE_CANCEL_URL,
-                client_reference_id=user_id,
-                allow_promotion_codes=True,
-            )
-        session = await asyncio.wait_for(create_session(), timeout=timeout)
-        return {"id": session.id, "url": session.url}
+        # The Stripe SDK is synchronous; run it in a worker thread so the event loop keeps serving requests
+        create_session = _run_stripe(
+            stripe.checkout.Session.create,
+            payment_method_types=["card"],
+            line_items=[{"price": price_id, "quantity": 1}],
+            mode=mode,
+            success_url=success_url,
+            cancel_url=cancel_url,
+            client_reference_id=user_id,
+            allow_promotion_codes=True,
+            # Carried on the webhook's session object so completion needs no extra Stripe lookup
+            metadata={"price_id": price_id},
+            idempotency_key=stripe_idempotency_key,
+        )
+        session = await asyncio.wait_for(create_session, timeout=timeout)
+        session_info = {"id": session.id, "url": session.url}
+        session_data = {
+            "user_id": user_id,
+            "price_id": price_id,
+            "mode": mode,
+            "status": "pending",
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        }
+        await _store_checkout_session(idempotency_key, session_info, session_data)
+        return session_info
     except asyncio.TimeoutError:
-        logging.error("Stripe checkout session creation timed out")
+        logger.error("Stripe checkout session creation timed out")
         return None
     except Exception as e:
-        logging.error(f"Error creating checkout session: {e}")
+        logger.error("Error creating checkout session: %s", e)
+        return None
+
+async def allow_webhook_event() -> bool:
+    """
+    Check the shared webhook intake budget for the current window.
+
+    Returns:
+        False if the budget is spent and the event should be refused with a 429 so Stripe retries it later
+    """
+    window = Config.RATE_LIMIT_WINDOW
+    bucket_key = f"{WEBHOOK_RATE_KEY_PREFIX}{int(time.time()) // window}"
+
+    async def _incr(redis):
+        return await redis.eval(_RATE_LIMIT_SCRIPT, keys=[bucket_key], args=[window])
+    try:
+        count = await redis_operation("webhook_rate_limit", _incr)
+    except Exception as e:
+        # Never turn away payment events because the limiter itself is unavailable
+        logger.warning("Could not check webhook rate limit: %s", e)
+        return True
+    return int(count) <= Config.WEBHOOK_RATE_LIMIT_REQUESTS
+
+def _first_price_id(line_items) -> Optional[str]:
+    """
+    Price ID of the first line in a Stripe list object (or plain list), or None if absent.
+    """
+    try:
+        if isinstance(line_items, dict):
+            line_items = line_items['data']
+        return line_items[0]['price']['id']
+    except (KeyError, IndexError, TypeError):
         return None
 
+async def _claim_webhook_event(event_id: str) -> bool:
+    """
+    Atomically record a Stripe event as seen. Returns False if it was already handled.
+    """
+    seen_key = f"{WEBHOOK_EVENT_SEEN_KEY_PREFIX}{event_id}"
+
+    async def _claim(redis):
+        return await redis.set(seen_key, "1", nx=True, ex=WEBHOOK_EVENT_SEEN_TTL_SECONDS)
+    try:
+        return bool(await redis_operation("claim_webhook_event", _claim))
+    except Exception as e:
+        # Better to risk a duplicate than to drop a payment because the gate is unavailable
+        logger.warning("Could not check webhook event %s for duplicates: %s", event_id, e)
+        return True
+
+async def _release_webhook_event(event_id: str) -> None:
+    """
+    Forgets a claimed Stripe event after its handling failed, so Stripe's
+    redelivery of it is handled instead of skipped as a duplicate.
+    """
+    seen_key = f"{WEBHOOK_EVENT_SEEN_KEY_PREFIX}{event_id}"
+
+    async def _release(redis):
+        return await redis.delete(seen_key)
+    try:
+        await redis_operation("release_webhook_event", _release, idempotent=True)
+    except Exception as e:
+        logger.error("Could not release webhook event %s, its redelivery will be skipped: %s", event_id, e)
+
+async def _grant_credits(user_id: str, credits: int, transaction_type: str, description: str) -> None:
+    """
+    Adds credits for a payment, raising if they were not added so the event is retried.
+    """
+    if await credits_service.add_credits(user_id, credits, transaction_type, description) is None:
+        raise RedisOperationError("add_credits", message=f"Could not add {credits} credits for user {user_id}")
+
+async def _link_stripe_customer(user_id: str, stripe_customer_id: str, stripe_subscription_id: Optional[str]) -> None:
+    """
+    Stores a subscriber's Stripe IDs, raising if they were not saved so the event is retried.
+    """
+    from ..services import user_service
+    if await user_service.update_user_stripe_ids(user_id, stripe_customer_id, stripe_subscription_id) is None:
+        # invoice.paid finds the subscriber by customer ID, so renewals would go uncredited
+        raise RedisOperationError("update_user_stripe_ids", message=f"Could not store Stripe IDs for user {user_id}")
+
 async def handle_webhook_event(event):
+    """
+    Handles a Stripe webhook event at most once.
+
+    The event is claimed before it is handled. If handling raises, the claim
+    is released and the error re-raised, so the route answers non-2xx and
+    Stripe's redelivery is handled again instead of skipped.
+    """
     event_type = event['type']
-    data_object = event['data']['object']
-    logging.info(f"Handling webhook event: {event['id']} ({event_type})")
+    if not await _claim_webhook_event(event['id']):
+        logger.info("Skipping already handled webhook event: %s (%s)", event['id'], event_type)
+        return
+    logger.info("Handling webhook event: %s (%s)", event['id'], event_type)
+    try:
+        await _dispatch_webhook_event(event_type, event['data']['object'])
+    except Exception:
+        await _release_webhook_event(event['id'])
+        raise
+
+async def _dispatch_webhook_event(event_type: str, data_object) -> None:
     if event_type == 'checkout.session.completed':
         session = data_object
         user_id = session.get('client_reference_id')
         price_id = None
         credits = 0
         mode = session.get('mode')
+        pending = {}
         # For one-time payment, add credits now
         if 'subscription' == mode:
-            # For subscriptions, credits are added on invoice.paid
-            pass
+            # For subscriptions, credits are added on invoice.paid, which finds the user by Stripe customer ID
+            if user_id and session.get('customer'):
+                pending["update_user_stripe_ids"] = _link_stripe_customer(user_id, session['customer'], session.get('subscription'))
         else:
             # For one-time payment, add credits now
             # Try to get price_id from line_items if present
-            if session.get('line_items'):
-                price_id = session['line_items'][0]['price']['id']
-            # If price_id is still missing, try metadata
+            price_id = _first_price_id(session.get('line_items'))
+            # Sessions we create carry the price in metadata (line_items is never expanded on webhooks)
             if not price_id and session.get('metadata', {}):
                 price_id = session['metadata'].get('price_id')
-            # If still missing, fetch line items from Stripe API
+            # Only sessions created without metadata need the extra Stripe round trip
             if not price_id:
                 session_id = session.get('id')
                 if session_id:
                     try:
-                        line_items = stripe.checkout.Session.list_line_items(session_id, limit=1)
+                        line_items = await _run_stripe(stripe.checkout.Session.list_line_items, session_id, limit=1)
                         if line_items and line_items.data:
                             price_id = line_items.data[0].price.id
                     except Exception as e:
-                        logging.error(f"Failed to fetch line items for session {session_id}: {e}")
+                        # Raised so the event is released and Stripe retries it
+                        logger.error("Failed to fetch line items for session %s: %s", session_id, e)
+                        raise
             if not price_id:
-                logging.error(f"No price_id found in session {session['id']}")
+                logger.error("No price_id found in session %s", session['id'])
                 return
             credits = STRIPE_PRICE_ID_TO_CREDITS.get(price_id, 0)
             if credits > 0 and user_id:
-                await credits_service.add_credits(user_id, credits, "purchase", f"Stripe purchase: {credits} credits")
+                pending["add_credits"] = _grant_credits(user_id, credits, "purchase", f"Stripe purchase: {credits} credits")
+        if session.get('id'):
+            # Logs its own failures; a missed status write must not replay the credit grant
+            pending["complete_checkout_session"] = _mark_checkout_session_completed(session['id'])
+        # The credit grant / user update and the session status write are independent,
+        # so let each finish and report every failure rather than only the first
+        results = await asyncio.gather(*pending.values(), return_exceptions=True)
+        failures = [(name, result) for name, result in zip(pending, results) if isinstance(result, BaseException)]
+        for name, failure in failures:
+            logger.error("%s failed for checkout session %s: %s", name, session.get('id'), failure)
+        if failures:
+            raise failures[0][1]
     elif event_type == 'invoice.paid':
         invoice = data_object
         stripe_customer_id = invoice.get('customer')
-        price_id = invoice['lines']['data'][0]['price']['id'] if invoice.get('lines', {}).get('data') else None
+        price_id = _first_price_id(invoice.get('lines'))
         credits = STRIPE_PRICE_ID_TO_CREDITS.get(price_id, 0)
         if credits > 0 and stripe_customer_id:
             from ..services import user_service
             user = await user_service.get_user_by_stripe_customer_id(stripe_customer_id)
             if user:
-                await credits_service.add_credits(user.id, credits, "subscription_renewal", f"Stripe subscription renewal: {credits} credits")
+                await _grant_credits(user.id, credits, "subscription_renewal", f"Stripe subscription renewal: {credits} credits")
     else:
-        logging.warning(f"Unhandled webhook event type: {event_type}")
+        logger.warning("Unhandled webhook event type: %s", event_type)
 
 async def get_user_purchases(user_id: str, limit: int = 10) -> List[Dict[str, Any]]:
     """
@@ -120,13 +426,11 @@ async def get_user_purchases(user_id: str, limit: int = 10) -> List[Dict[str, An
         List of purchase records
     """
     try:
-        # Get transactions of type "purchase" from credits service
-        transactions = await credits_service.get_transactions(user_id)
-        purchases = [t for t in transactions if t["type"] in ["purchase", "subscription_renewal"]]
-        
-        # Sort by timestamp (newest first) and limit
-        purchases.sort(key=lambda x: x["timestamp"], reverse=True)
-        return purchases[:limit]
+        return await credits_service.get_transactions_page(
+            user_id,
+            limit=limit,
+            types=credits_service.PURCHASE_TRANSACTION_TYPES
+        )
     except Exception as e:
-        logging.error(f"Error getting purchase history for user {user_id}: {e}")
+        logger.error("Error getting purchase history for user %s: %s", user_id, e)
         return []
@@ -3,23 +3,63 @@ Token service for handling JWT token operations.
 """
 
 import logging
-from datetime import datetime, timedelta, timezone
+import base64
+import functools
+import hmac
+import time
+from datetime import timedelta
 from typing import Dict, Optional, Any
 
-from jose import jwt, JWTError
+import jwt
+import orjson
+from cachetools import TTLCache
 
 from ..config import Config
-from ..utils.exceptions import AuthenticationError
+from ..utils.exceptions import AuthenticationError, ConfigurationError
 from ..utils.db import redis_operation
 
 import secrets
 import hashlib
 import asyncio
 
+logger = logging.getLogger(__name__)
+
 # Constants
 ACCESS_TOKEN_EXPIRE_MINUTES = 60  # 1 hour (reduced from 7 days for better security)
 REFRESH_TOKEN_EXPIRE_DAYS = 365  # 365 days for long-lived refresh tokens
 REFRESH_TOKEN_REDIS_PREFIX = "refresh_token:"
+REFRESH_TOKEN_INDEX_REDIS_PREFIX = "refresh_tokens_index:"  # Set of a user's refresh token hashes
+
+# Verified payloads by token digest. The short TTL (vs. the token lifetime) bounds how long
+# a cached token outlives a secret rotation; expiry is still re-checked on every hit.
+DECODED_TOKEN_CACHE_TTL_SECONDS = 60
+_decoded_token_cache: TTLCache = TTLCache(maxsize=10_000, ttl=DECODED_TOKEN_CACHE_TTL_SECONDS)
+
+
+# HS256 is the only algorithm in use, so the header segment never changes
+_HS256_HEADER_SEGMENT = base64.urlsafe_b64encode(orjson.dumps({"alg": "HS256", "typ": "JWT"})).rstrip(b"=")
+
+
+@functools.lru_cache(maxsize=1)
+def _jwt_key(secret: Optional[str]) -> bytes:
+    """
+    Returns the normalized JWT signing key, computed once per secret value.
+    Keyed on the raw setting so a changed secret (e.g. hot reload) is picked up.
+    """
+    if not secret:
+        raise ConfigurationError("JWT_SECRET_KEY", "JWT secret key not configured")
+    return secret.encode()
+
+
+def _encode_hs256(payload: Dict[str, Any], key: bytes) -> str:
+    """
+    Signs a payload as an HS256 JWT without going through PyJWT's algorithm lookup.
+    Tokens are standard compact JWS and are verified with jwt.decode.
+    """
+    payload_segment = base64.urlsafe_b64encode(orjson.dumps(payload)).rstrip(b"=")
+    signing_input = _HS256_HEADER_SEGMENT + b"." + payload_segment
+    signature = hmac.new(key, signing_input, hashlib.sha256).digest()
+    return (signing_input + b"." + base64.urlsafe_b64encode(signature).rstrip(b"=")).decode()
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
@@ -34,17 +74,19 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
         JWT token string
     """
     to_encode = data.copy()
+    # JWT NumericDate: plain integer seconds avoid building tz-aware datetimes per token
+    now = int(time.time())
     if expires_delta:
-        expire = datetime.now(timezone.utc) + expires_delta
+        expire = now + int(expires_delta.total_seconds())
     else:
-        expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+        expire = now + ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    to_encode["exp"] = expire
 
     try:
-        encoded_jwt = jwt.encode(to_encode, Config.JWT_SECRET_KEY, algorithm="HS256")
+        encoded_jwt = _encode_hs256(to_encode, _jwt_key(Config.JWT_SECRET_KEY))
         return encoded_jwt
     except Exception as e:
-        logging.error(f"Error creating access token: {e}")
+        logger.error("Error creating access token: %s", e)
         raise AuthenticationError(f"Failed to create access token: {str(e)}")
 
 
@@ -61,11 +103,27 @@ def decode_token(token: str) -> Dict[str, Any]:
     Raises:
         AuthenticationError: If the token is invalid or expired
     """
+    # blake2b is only a fast cache key here, not a MAC
+    cache_key = hashlib.blake2b(token.encode(), digest_size=16).digest()
+    payload = _decoded_token_cache.get(cache_key)
+    if payload is not None:
+        if payload["exp"] > time.time():
+            # A copy, so a caller editing its payload can't change later decodes
+            return dict(payload)
+        _decoded_token_cache.pop(cache_key, None)
+        raise AuthenticationError("Invalid token: Signature has expired.")
+
     try:
-        payload = jwt.decode(token, Config.JWT_SECRET_KEY, algorithms=["HS256"])
+        payload = jwt.decode(
+            token,
+            _jwt_key(Config.JWT_SECRET_KEY),
+            algorithms=["HS256"],
+            options={"require": ["exp", "sub", "email"]}
+        )
+        _decoded_token_cache[cache_key] = dict(payload)
         return payload
-    except JWTError as e:
-        logging.error(f"Error decoding token: {e}")
+    except jwt.PyJWTError as e:
+        logger.error("Error decoding token: %s", e)
         raise AuthenticationError(f"Invalid token: {str(e)}")
 
 
@@ -83,7 +141,7 @@ def create_user_token(user_id: str, email: str) -> str:
     token_data = {
         "sub": user_id,
         "email": email,
-        "iat": datetime.now(timezone.utc)
+        "iat": int(time.time())
     }
     return create_access_token(token_data)
 
@@ -101,25 +159,26 @@ def validate_token(token: str) -> Dict[str, Any]:
     Raises:
         AuthenticationError: If the token is invalid or expired
     """
-    try:
-        payload = decode_token(token)
+    # decode_token already enforces the signature, exp and the required claims
+    return decode_token(token)
 
-        # Check if token has required fields
-        if "sub" not in payload or "email" not in payload:
-            raise AuthenticationError("Token missing required fields")
 
-        # Check if token is expired
-        if "exp" in payload:
-            expiration = datetime.fromtimestamp(payload["exp"], tz=timezone.utc)
-            if expiration < datetime.now(timezone.utc):
-                raise AuthenticationError("Token has expired")
+def _hash_refresh_token(token: str) -> str:
+    """
+    Returns the digest a refresh token is stored under in Redis.
 
-        return payload
-    except AuthenticationError:
-        raise
-    except Exception as e:
-        logging.error(f"Unexpected error validating token: {e}")
-        raise AuthenticationError(f"Token validation failed: {str(e)}")
+    This is a lookup key, not a signature, and the token itself carries 512 bits
+    of entropy, so a 128-bit BLAKE2b digest is plenty and cheaper than SHA-256.
+    """
+    return hashlib.blake2b(token.encode(), digest_size=16).hexdigest()
+
+
+def _legacy_hash_refresh_token(token: str) -> str:
+    """
+    Returns the SHA-256 digest refresh tokens were stored under before BLAKE2b.
+    Only used to honour tokens issued before the switch until they expire.
+    """
+    return hashlib.sha256(token.encode()).hexdigest()
 
 
 async def generate_refresh_token(user_id: str) -> str:
@@ -127,12 +186,18 @@ async def generate_refresh_token(user_id: str) -> str:
     Generates a secure refresh token, stores its hash in Redis with expiry, and returns the plaintext token.
     """
     token = secrets.token_urlsafe(64)
-    token_hash = hashlib.sha256(token.encode()).hexdigest()
+    token_hash = _hash_refresh_token(token)
     redis_key = f"{REFRESH_TOKEN_REDIS_PREFIX}{user_id}:{token_hash}"
+    index_key = f"{REFRESH_TOKEN_INDEX_REDIS_PREFIX}{user_id}"
     expire_seconds = REFRESH_TOKEN_EXPIRE_DAYS * 24 * 60 * 60
 
     async def _set(redis):
-        await redis.set(redis_key, "1", ex=expire_seconds)
+        pipe = redis.pipeline()
+        pipe.set(redis_key, "1", ex=expire_seconds)
+        pipe.sadd(index_key, token_hash)
+        # The index lives as long as the newest token it tracks
+        pipe.expire(index_key, expire_seconds)
+        await pipe.exec()
         return True
     await redis_operation("set_refresh_token", _set)
     return token
@@ -142,11 +207,15 @@ async def validate_refresh_token(user_id: str, token: str) -> bool:
     """
     Validates a refresh token for a user by checking its hash in Redis.
     """
-    token_hash = hashlib.sha256(token.encode()).hexdigest()
+    token_hash = _hash_refresh_token(token)
     redis_key = f"{REFRESH_TOKEN_REDIS_PREFIX}{user_id}:{token_hash}"
     async def _get(redis):
-        return await redis.get(redis_key)
-    result = await redis_operation("get_refresh_token", _get)
+        result = await redis.get(redis_key)
+        if result is None:
+            legacy_key = f"{REFRESH_TOKEN_REDIS_PREFIX}{user_id}:{_legacy_hash_refresh_token(token)}"
+            result = await redis.get(legacy_key)
+        return result
+    result = await redis_operation("get_refresh_token", _get, idempotent=True)
     return result is not None
 
 
@@ -154,23 +223,38 @@ async def revoke_refresh_token(user_id: str, token: str) -> bool:
     """
     Revokes a refresh token by deleting its hash from Redis.
     """
-    token_hash = hashlib.sha256(token.encode()).hexdigest()
-    redis_key = f"{REFRESH_TOKEN_REDIS_PREFIX}{user_id}:{token_hash}"
+    token_hash = _hash_refresh_token(token)
+    legacy_token_hash = _legacy_hash_refresh_token(token)
+    key_prefix = f"{REFRESH_TOKEN_REDIS_PREFIX}{user_id}:"
+    redis_key = key_prefix + token_hash
+    legacy_key = key_prefix + legacy_token_hash
+    index_key = f"{REFRESH_TOKEN_INDEX_REDIS_PREFIX}{user_id}"
     async def _del(redis):
-        return await redis.delete(redis_key)
+        pipe = redis.pipeline()
+        pipe.delete(redis_key, legacy_key)
+        pipe.srem(index_key, token_hash, legacy_token_hash)
+        deleted, _ = await pipe.exec()
+        return deleted
     result = await redis_operation("del_refresh_token", _del)
-    return result == 1
+    return result >= 1
 
 
 async def revoke_all_refresh_tokens(user_id: str) -> int:
     """
     Revokes all refresh tokens for a user (logs out from all devices).
     """
-    # Pattern: refresh_token:{user_id}:*
-    pattern = f"{REFRESH_TOKEN_REDIS_PREFIX}{user_id}:*"
+    # Look tokens up through the per-user index instead of a KEYS scan,
+    # which is O(keyspace) and blocks Redis for every other client
+    index_key = f"{REFRESH_TOKEN_INDEX_REDIS_PREFIX}{user_id}"
     async def _del_all(redis):
-        keys = await redis.keys(pattern)
-        if not keys:
+        token_hashes = await redis.smembers(index_key)
+        if not token_hashes:
             return 0
-        return await redis.delete(*keys)
+        key_prefix = f"{REFRESH_TOKEN_REDIS_PREFIX}{user_id}:"
+        keys = [key_prefix + token_hash for token_hash in token_hashes]
+        pipe = redis.pipeline()
+        pipe.delete(*keys)
+        pipe.delete(index_key)
+        deleted, _ = await pipe.exec()
+        return deleted
     return await redis_operation("del_all_refresh_tokens", _del_all)
@@ -3,17 +3,22 @@ User service for handling user-related operations.
 """
 
 import logging
+import time
 import uuid
 from datetime import datetime, timezone
-from typing import Dict, Any, Optional, Tuple
+from typing import Dict, Any, List, Optional, Tuple
 
+import orjson
+from cachetools import TTLCache
 from pydantic import ValidationError
 
 from ..models.user import User
 from ..utils.db import redis_operation
-from ..utils.exceptions import ResourceNotFoundError, ValidationError as AppValidationError
+from ..utils.exceptions import RedisOperationError, ResourceNotFoundError, ValidationError as AppValidationError
 from ..services import credits_service
 
+logger = logging.getLogger(__name__)
+
 
 # Redis key prefixes
 USER_KEY_PREFIX = "user:"
@@ -21,30 +26,188 @@ GOOGLE_ID_KEY_PREFIX = "google:"
 EMAIL_KEY_PREFIX = "email:"
 STRIPE_CUSTOMER_ID_KEY_PREFIX = "stripe:customer:"
 
+# Parsed users by ID, so repeat authenticated requests skip Redis and Pydantic.
+# The short TTL bounds how stale a user saved by another instance can be here.
+USER_CACHE_MAX_SIZE = 10_000
+USER_CACHE_TTL_SECONDS = 30
+_user_cache = TTLCache(maxsize=USER_CACHE_MAX_SIZE, ttl=USER_CACHE_TTL_SECONDS)
+# Google ID -> user ID, so Google sign-ins resolve through _user_cache too
+_google_id_cache = TTLCache(maxsize=USER_CACHE_MAX_SIZE, ttl=USER_CACHE_TTL_SECONDS)
+
+
+# Sorted set of recently saved user IDs scored by save time. Every instance
+# polls it so a user saved elsewhere is dropped from the local caches within
+# USER_INVALIDATION_POLL_SECONDS instead of lingering for the full TTL.
+USER_INVALIDATIONS_KEY = "user_invalidations"
+USER_INVALIDATION_POLL_SECONDS = 2
+USER_INVALIDATION_CLOCK_SKEW_SECONDS = 5  # Overlap between polls, for clock drift between instances
+USER_INVALIDATION_RETENTION_SECONDS = USER_CACHE_TTL_SECONDS * 2
+_last_invalidation_poll = time.time()
+
+
+def _cache_user(user: User) -> None:
+    """
+    Remembers a freshly loaded or saved user under its ID and Google ID.
 
-async def get_user_by_id(user_id: str) -> Optional[User]:
+    Cached users are never handed out directly: the cache keeps its own copy and
+    callers get a copy on every hit, so mutating a returned user (as routes do
+    before save_user) can't change what other requests read.
+    """
+    _user_cache[user.id] = user.model_copy()
+    if user.google_id:
+        _google_id_cache[user.google_id] = user.id
+
+
+def _queue_user_invalidation(pipe, user_id: str) -> None:
+    """Adds the commands announcing a saved user to other instances to a pipeline."""
+    now = time.time()
+    pipe.zadd(USER_INVALIDATIONS_KEY, {user_id: now})
+    pipe.zremrangebyscore(USER_INVALIDATIONS_KEY, "-inf", now - USER_INVALIDATION_RETENTION_SECONDS)
+
+
+async def _poll_user_invalidations() -> None:
+    """
+    Drops locally cached users that another instance has saved since the last poll.
+
+    Upstash is reached over REST, which has no pub/sub subscriptions, so
+    instances pull the invalidation set instead, at most once every
+    USER_INVALIDATION_POLL_SECONDS.
+    """
+    global _last_invalidation_poll
+    now = time.time()
+    if now - _last_invalidation_poll < USER_INVALIDATION_POLL_SECONDS:
+        return
+    since = _last_invalidation_poll - USER_INVALIDATION_CLOCK_SKEW_SECONDS
+    _last_invalidation_poll = now
+
+    async def _read_invalidations(redis):
+        return await redis.zrangebyscore(USER_INVALIDATIONS_KEY, since, "+inf")
+
+    try:
+        user_ids = await redis_operation("poll_user_invalidations", _read_invalidations, idempotent=True)
+    except Exception as e:
+        logger.warning("Could not poll user cache invalidations: %s", e)
+        return
+
+    for user_id in user_ids:
+        cached_user = _user_cache.pop(user_id, None)
+        if cached_user is not None and cached_user.google_id:
+            _google_id_cache.pop(cached_user.google_id, None)
+
+# Writes a patched user (ARGV[2]) to KEYS[1] only if it still holds ARGV[1],
+# the JSON the patch was computed from. The next ARGV[3] keys get the same
+# copy (email, Google ID and Stripe customer indexes), any keys after them
+# are deleted (index entries for a replaced email, Google ID or Stripe
+# customer ID), and the save is recorded in the invalidation set KEYS[2]
+# (user ARGV[4], scored ARGV[5], pruned below ARGV[6]). Returns 0 without
+# writing if the user changed or no longer exists.
+_PATCH_USER_SCRIPT = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[2])
+local copies = tonumber(ARGV[3])
+for i = 3, #KEYS do
+    if i <= 2 + copies then
+        redis.call('SET', KEYS[i], ARGV[2])
+    else
+        redis.call('DEL', KEYS[i])
+    end
+end
+redis.call('ZADD', KEYS[2], ARGV[5], ARGV[4])
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', ARGV[6])
+return 1
+"""
+
+# A patch recomputed this many times because the user kept changing underneath it gives up
+PATCH_USER_MAX_ATTEMPTS = 3
+
+# Field set of a saved user; stored data with exactly these keys skips re-validation
+_USER_FIELDS = frozenset(User.model_fields)
+
+async def _get_indexed_user_json(redis, index_key: str) -> Optional[str]:
+    """
+    Reads the user data stored under an index key.
+
+    The email, Google ID and Stripe customer indexes hold a copy of the user
+    JSON, so a lookup is a single GET. Entries written before the indexes were
+    denormalized hold the user key instead and cost a second GET.
+
+    Args:
+        redis: The Redis client
+        index_key: The email, Google ID or Stripe customer index key
+
+    Returns:
+        The user JSON if found, None otherwise
+    """
+    value = await redis.get(index_key)
+    if value and value.startswith(USER_KEY_PREFIX):
+        return await redis.get(value)
+    return value
+
+
+async def _get_user_json(redis, user_key: str) -> Optional[str]:
+    """
+    Reads the user data stored under a user key.
+    """
+    return await redis.get(user_key)
+
+
+def _parse_user_json(user_data_json: Optional[str], lookup: str) -> Optional[User]:
+    """
+    Parses stored user data, logging and returning None if it is missing or invalid.
+
+    Users are validated by Pydantic before they are saved, so stored data is
+    trusted and rebuilt with model_construct instead of being re-validated.
+    Only created_at needs converting back from its JSON form. Anything that
+    does not look like a saved user goes through full validation.
+
+    Args:
+        user_data_json: The stored user JSON
+        lookup: The ID, email or other value the user was looked up by, for logging
+
+    Returns:
+        User object if the data is present and valid, None otherwise
+    """
+    if not user_data_json:
+        return None
+    try:
+        user_data = orjson.loads(user_data_json)
+        if set(user_data) == _USER_FIELDS and isinstance(user_data["created_at"], str):
+            user_data["created_at"] = datetime.fromisoformat(user_data["created_at"])
+            return User.model_construct(**user_data)
+    except (orjson.JSONDecodeError, ValueError):
+        pass
+    try:
+        return User.model_validate_json(user_data_json)
+    except ValidationError as e:
+        logger.error("Error parsing user data for %s: %s", lookup, e)
+        return None
+
+
+async def get_user_by_id(user_id: str, use_cache: bool = True) -> Optional[User]:
     """
     Retrieves a user by ID.
 
     Args:
         user_id: The user's ID
+        use_cache: Whether a recently parsed copy may be returned instead of
+            reading from Redis. Read-modify-write callers should pass False.
 
     Returns:
         User object if found, None otherwise
     """
-    key = f"{USER_KEY_PREFIX}{user_id}"
+    if use_cache:
+        await _poll_user_invalidations()
+        cached_user = _user_cache.get(user_id)
+        if cached_user is not None:
+            return cached_user.model_copy()
 
-    async def _get_user(redis, user_id):
-        user_data_json = await redis.get(key)
-        if not user_data_json:
-            return None
-        try:
-            return User.model_validate_json(user_data_json)
-        except ValidationError as e:
-            logging.error(f"Error parsing user data for {user_id}: {e}")
-            return None
-
-    return await redis_operation("get_user_by_id", _get_user, user_id)
+    user_data_json = await redis_operation("get_user_by_id", _get_user_json, USER_KEY_PREFIX + user_id, idempotent=True)
+    user = _parse_user_json(user_data_json, user_id)
+    if user is not None:
+        _cache_user(user)
+    return user
 
 
 async def get_user_by_email(email: str) -> Optional[User]:
@@ -57,26 +220,9 @@ async def get_user_by_email(email: str) -> Optional[User]:
     Returns:
         User object if found, None otherwise
     """
-    email_key = f"{EMAIL_KEY_PREFIX}{email}"
-
-    async def _get_user_by_email(redis, email):
-        # Get the user key from the email index
-        user_key = await redis.get(email_key)
-        if not user_key:
-            return None
-
-        # Get the user data
-        user_data_json = await redis.get(user_key)
-        if not user_data_json:
-            return None
-
-        try:
-            return User.model_validate_json(user_data_json)
-        except ValidationError as e:
-            logging.error(f"Error parsing user data for email {email}: {e}")
-            return None
-
-    return await redis_operation("get_user_by_email", _get_user_by_email, email)
+    # The email index holds a copy of the user data
+    user_data_json = await redis_operation("get_user_by_email", _get_indexed_user_json, EMAIL_KEY_PREFIX + email, idempotent=True)
+    return _parse_user_json(user_data_json, email)
 
 
 async def get_user_by_google_id(google_id: str) -> Optional[User]:
@@ -89,51 +235,36 @@ async def get_user_by_google_id(google_id: str) -> Optional[User]:
     Returns:
         User object if found, None otherwise
     """
-    google_id_key = f"{GOOGLE_ID_KEY_PREFIX}{google_id}"
-
-    async def _get_user_by_google_id(redis, google_id):
-        # Get the user key from the Google ID index
-        user_key = await redis.get(google_id_key)
-        if not user_key:
-            return None
-
-        # Get the user data
-        user_data_json = await redis.get(user_key)
-        if not user_data_json:
-            return None
-
-        try:
-            return User.model_validate_json(user_data_json)
-        except ValidationError as e:
-            logging.error(f"Error parsing user data for Google ID {google_id}: {e}")
-            return None
-
-    return await redis_operation("get_user_by_google_id", _get_user_by_google_id, google_id)
+    await _poll_user_invalidations()
+    cached_user_id = _google_id_cache.get(google_id)
+    if cached_user_id is not None:
+        cached_user = _user_cache.get(cached_user_id)
+        if cached_user is not None and cached_user.google_id == google_id:
+            return cached_user.model_copy()
+
+    # The Google ID index holds a copy of the user data
+    user_data_json = await redis_operation(
+        "get_user_by_google_id", _get_indexed_user_json, GOOGLE_ID_KEY_PREFIX + google_id, idempotent=True
+    )
+    user = _parse_user_json(user_data_json, google_id)
+    if user is not None:
+        _cache_user(user)
+    return user
 
 
 async def get_user_by_stripe_customer_id(stripe_customer_id: str) -> Optional[User]:
     """
     Retrieves a user by Stripe Customer ID.
     """
-    stripe_key = f"{STRIPE_CUSTOMER_ID_KEY_PREFIX}{stripe_customer_id}"
-
-    async def _get_user_by_stripe_id(redis, stripe_customer_id):
-        # Get the user key from the Stripe Customer ID index
-        user_key = await redis.get(stripe_key)
-        if not user_key:
-            logging.info(f"No user key found for Stripe Customer ID: {stripe_customer_id}")
-            return None
-        # Get the user data
-        user_data_json = await redis.get(user_key)
-        if not user_data_json:
-            logging.warning(f"User key {user_key} found for Stripe ID {stripe_customer_id}, but no user data.")
-            return None
-        try:
-            return User.model_validate_json(user_data_json)
-        except ValidationError as e:
-            logging.error(f"Error parsing user data for Stripe ID {stripe_customer_id}: {e}")
-            return None
-    return await redis_operation("get_user_by_stripe_customer_id", _get_user_by_stripe_id, stripe_customer_id)
+    # The Stripe Customer ID index holds a copy of the user data
+    user_data_json = await redis_operation(
+        "get_user_by_stripe_customer_id", _get_indexed_user_json, STRIPE_CUSTOMER_ID_KEY_PREFIX + stripe_customer_id,
+        idempotent=True
+    )
+    if not user_data_json:
+        logger.info("No user found for Stripe Customer ID: %s", stripe_customer_id)
+        return None
+    return _parse_user_json(user_data_json, stripe_customer_id)
 
 
 async def create_user(user_data: Dict[str, Any]) -> User:
@@ -172,7 +303,7 @@ async def create_user(user_data: Dict[str, Any]) -> User:
 
         return new_user
     except ValidationError as e:
-        logging.error(f"Error creating user: {e}")
+        logger.error("Error creating user: %s", e)
         raise AppValidationError("Invalid user data", errors=e.errors())
 
 
@@ -180,6 +311,9 @@ async def save_user(user: User) -> bool:
     """
     Saves a user to the database.
 
+    The email, Google ID and Stripe customer indexes store a full copy of the
+    user data so that lookups by any of them take a single GET.
+
     Args:
         user: The User object to save
 
@@ -189,72 +323,129 @@ async def save_user(user: User) -> bool:
     user_key = f"{USER_KEY_PREFIX}{user.id}"
     email_key = f"{EMAIL_KEY_PREFIX}{user.email}"
 
+    # Serialize once, before the Redis call, and reuse the string for every
+    # copy. model_dump_json runs pydantic-core's Rust serializer in a single
+    # pass (no validation), which beats orjson over model_dump(mode="json").
+    user_data_json = user.model_dump_json()
+
     async def _save_user(redis, user):
+        # Queue the user data and all of its indexes so they go out in a
+        # single round trip instead of one per SET. MULTI/EXEC applies them
+        # atomically, so a reader never sees an index copy that disagrees
+        # with the user key.
+        pipe = redis.multi()
+
         # Store the user data
-        await redis.set(user_key, user.model_dump_json())
+        pipe.set(user_key, user_data_json)
 
         # Store the email index
         if user.email:
-            await redis.set(email_key, user_key)
+            pipe.set(email_key, user_data_json)
 
         # Store the Google ID index if available
         if user.google_id:
             google_id_key = f"{GOOGLE_ID_KEY_PREFIX}{user.google_id}"
-            await redis.set(google_id_key, user_key)
+            pipe.set(google_id_key, user_data_json)
 
         # Store the Stripe Customer ID index if available
         if user.stripe_customer_id:
             stripe_customer_id_key = f"{STRIPE_CUSTOMER_ID_KEY_PREFIX}{user.stripe_customer_id}"
-            await redis.set(stripe_customer_id_key, user_key)
+            pipe.set(stripe_customer_id_key, user_data_json)
 
+        # Let other instances drop their cached copy
+        _queue_user_invalidation(pipe, user.id)
+
+        await pipe.exec()
         return True
 
     try:
-        return await redis_operation("save_user", _save_user, user)
+        saved = await redis_operation("save_user", _save_user, user)
     except Exception as e:
-        logging.error(f"Error saving user {user.id}: {e}")
+        logger.error("Error saving user %s: %s", user.id, e)
+        _user_cache.pop(user.id, None)
         return False
 
+    _cache_user(user)
+    return saved
+
 
-async def update_user(user_id: str, update_data: Dict[str, Any]) -> User:
+async def patch_user_fields(user_id: str, fields: Dict[str, Any]) -> User:
     """
-    Updates a user's information.
+    Updates fields of a stored user without re-validating it.
+
+    The patched JSON is built here by Pydantic, so it has the same shape as
+    anything save_user writes, and stored by a Lua script together with its
+    email, Google ID and Stripe customer copies, atomically. The script only
+    writes if the user is unchanged since it was read; otherwise the patch is
+    recomputed from the new data. When the email, Google ID or Stripe customer
+    ID changes, the index entry under the old value is deleted in the same
+    script.
 
     Args:
         user_id: The user's ID
-        update_data: Dictionary containing fields to update
+        fields: Field names and their new values
 
     Returns:
         The updated User object
 
     Raises:
         ResourceNotFoundError: If the user is not found
-        ValidationError: If the update data is invalid
+        ValueError: If fields contains an unknown field or the user ID
+        RedisOperationError: If the user kept changing for PATCH_USER_MAX_ATTEMPTS tries
     """
-    # Get the current user
-    user = await get_user_by_id(user_id)
-    if not user:
-        raise ResourceNotFoundError("User", user_id)
+    unsupported = set(fields) - (_USER_FIELDS - {"id"})
+    if unsupported:
+        raise ValueError(f"Cannot patch user fields: {', '.join(sorted(unsupported))}")
 
-    # Update the user object
-    user_dict = user.model_dump()
-    for key, value in update_data.items():
-        if hasattr(user, key):
-            user_dict[key] = value
+    user_key = f"{USER_KEY_PREFIX}{user_id}"
 
-    try:
-        # Create a new user object with the updated data
-        updated_user = User(**user_dict)
+    async def _patch_user(redis, keys, args):
+        return await redis.eval(_PATCH_USER_SCRIPT, keys=keys, args=args)
 
-        # Save the updated user
-        success = await save_user(updated_user)
-        if not success:
-            raise Exception("Failed to save updated user")
+    for _ in range(PATCH_USER_MAX_ATTEMPTS):
+        current_json = await redis_operation("get_user_by_id", _get_user_json, user_key, idempotent=True)
+        current = _parse_user_json(current_json, user_id)
+        if current is None:
+            _user_cache.pop(user_id, None)
+            raise ResourceNotFoundError("User", user_id)
 
-        return updated_user
-    except ValidationError as e:
-        logging.error(f"Error updating user {user_id}: {e}")
-        raise AppValidationError("Invalid user data", errors=e.errors())
+        user = current.model_copy(update=fields)
+        keys, args = _patch_user_command(user_key, current, user, current_json)
+        if await redis_operation("patch_user_fields", _patch_user, keys, args):
+            _cache_user(user)
+            return user
+
+    raise RedisOperationError("patch_user_fields", message=f"User {user_id} kept changing during the update")
+
+
+def _patch_user_command(user_key: str, current: User, user: User, current_json: str) -> Tuple[List[str], List[Any]]:
+    """
+    Builds the KEYS and ARGV for _PATCH_USER_SCRIPT, declaring every key the script touches.
+    """
+    copy_keys = []
+    if user.email:
+        copy_keys.append(f"{EMAIL_KEY_PREFIX}{user.email}")
+    if user.google_id:
+        copy_keys.append(f"{GOOGLE_ID_KEY_PREFIX}{user.google_id}")
+    if user.stripe_customer_id:
+        copy_keys.append(f"{STRIPE_CUSTOMER_ID_KEY_PREFIX}{user.stripe_customer_id}")
+
+    # Index entries that no longer point at this user
+    delete_keys = []
+    if current.email and current.email != user.email:
+        delete_keys.append(f"{EMAIL_KEY_PREFIX}{current.email}")
+    if current.google_id and current.google_id != user.google_id:
+        delete_keys.append(f"{GOOGLE_ID_KEY_PREFIX}{current.google_id}")
+    if current.stripe_customer_id and current.stripe_customer_id != user.stripe_customer_id:
+        delete_keys.append(f"{STRIPE_CUSTOMER_ID_KEY_PREFIX}{current.stripe_customer_id}")
+
+    now = time.time()
+    keys = [user_key, USER_INVALIDATIONS_KEY, *copy_keys, *delete_keys]
+    args = [
+        current_json, user.model_dump_json(), len(copy_keys),
+        user.id, now, now - USER_INVALIDATION_RETENTION_SECONDS
+    ]
+    return keys, args
 
 
 async def update_user_stripe_customer_id(user_id: str, stripe_customer_id: str) -> Optional[User]:
@@ -262,12 +453,12 @@ async def update_user_stripe_customer_id(user_id: str, stripe_customer_id: str)
     Updates only the Stripe Customer ID for a user.
     """
     try:
-        return await update_user(user_id, {"stripe_customer_id": stripe_customer_id})
+        return await patch_user_fields(user_id, {"stripe_customer_id": stripe_customer_id})
     except ResourceNotFoundError:
-        logging.error(f"User {user_id} not found when trying to update Stripe Customer ID.")
+        logger.error("User %s not found when trying to update Stripe Customer ID.", user_id)
         return None
     except Exception as e:
-        logging.error(f"Failed to update Stripe Customer ID for user {user_id}: {e}")
+        logger.error("Failed to update Stripe Customer ID for user %s: %s", user_id, e)
         return None
 
 
@@ -280,12 +471,12 @@ async def update_user_stripe_ids(user_id: str, stripe_customer_id: str, stripe_s
         "stripe_subscription_id": stripe_subscription_id
     }
     try:
-        return await update_user(user_id, update_data)
+        return await patch_user_fields(user_id, update_data)
     except ResourceNotFoundError:
-        logging.error(f"User {user_id} not found when trying to update Stripe IDs.")
+        logger.error("User %s not found when trying to update Stripe IDs.", user_id)
         return None
     except Exception as e:
-        logging.error(f"Failed to update Stripe IDs for user {user_id}: {e}")
+        logger.error("Failed to update Stripe IDs for user %s: %s", user_id, e)
         return None
 
 
@@ -323,7 +514,9 @@ async def get_or_create_google_user(google_user_info: Dict[str, Any]) -> Tuple[U
             update_needed = True
 
         if update_needed:
-            user = await update_user(user.id, update_data)
+            # Only plain profile fields change here, so patch them in place
+            # rather than re-reading, re-validating and re-saving the whole user
+            user = await patch_user_fields(user.id, update_data)
 
         return user, False
 
@@ -1,26 +1,212 @@
 """
 YouTube transcript fetching services using pytubefix
 """
+import asyncio
+import logging
+import os
+import platform
+import random
+import socket
+import threading
 import time
-import traceback
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from typing import List, Dict, Any, Optional
 import re
 
 from pytubefix import YouTube
-from pytubefix.exceptions import (
-    VideoUnavailable,
-    VideoPrivate,
-    VideoRegionBlocked,
-    AgeRestrictedError,
-    LiveStreamError,
-    MembersOnly,
-    RecordingUnavailable,
-    PytubeFixError
-)
+
+import httpx
+import orjson
+from cachetools import TTLCache
 
 from api.config import Config
+from api.services.openai_service import create_chapter_prompt, generate_chapters_with_openai
+from api.utils.cache import read_shared, write_shared
+from api.utils.exceptions import ResourceNotFoundError, ValidationError
+from api.utils.srt import parse_srt_to_transcript
+from api.utils.transcript import format_transcript_for_model
 # Decodo proxy config does not require SSL CA patching or special logic
 
+logger = logging.getLogger(__name__)
+# Per-fetch progress is logged at DEBUG; set YOUTUBE_DEBUG=1 to see it
+if os.getenv("YOUTUBE_DEBUG") == "1":
+    logger.setLevel(logging.DEBUG)
+
+
+@lru_cache(maxsize=1)
+def _environment_info() -> str:
+    """
+    Describe the host for debug logs. It doesn't change between fetches, and
+    platform() and gethostname() aren't cheap enough to call on every one.
+    """
+    return f"platform={platform.platform()}, hostname={socket.gethostname()}, pid={os.getpid()}"
+
+
+def _install_proxy_opener() -> bool:
+    """
+    Route pytubefix's urllib requests through the Decodo proxy, if configured.
+
+    The opener is process-global, so it is installed once at import rather
+    than rebuilt and swapped in on every fetch from concurrent worker threads.
+
+    Returns:
+        Whether a proxy opener was installed
+    """
+    proxy_url = Config.get_proxy_url()
+    if not proxy_url:
+        return False
+    proxy_handler = urllib.request.ProxyHandler({
+        'http': proxy_url,
+        'https': proxy_url
+    })
+    urllib.request.install_opener(urllib.request.build_opener(proxy_handler))
+    return True
+
+
+PROXY_OPENER_INSTALLED = _install_proxy_opener()
+
+# Preferred caption codes as (manual, auto-generated) pairs, built once from the static config
+TRANSCRIPT_LANGUAGE_CODES = tuple((lang, f"a.{lang}") for lang in Config.TRANSCRIPT_LANGUAGES)
+
+# Transcripts never change for a given video, so fetched ones are shared across instances via Redis
+TRANSCRIPT_CACHE_KEY_PREFIX = "transcript:"
+TRANSCRIPT_CACHE_TTL_SECONDS = 60 * 60 * 24 * 7
+# Videos without captions are remembered too (as an empty transcript), for less
+# time since captions can still be added later
+NO_CAPTIONS_CACHE_TTL_SECONDS = 60 * 60
+# Recently served transcripts are also kept in-process so repeat requests on a
+# warm instance skip the Redis round trip and the JSON parse. Kept small since
+# a long video's transcript can run to hundreds of kilobytes.
+LOCAL_TRANSCRIPT_CACHE_MAX_SIZE = 64
+LOCAL_TRANSCRIPT_CACHE_TTL_SECONDS = 60 * 10
+_local_transcript_cache = TTLCache(maxsize=LOCAL_TRANSCRIPT_CACHE_MAX_SIZE, ttl=LOCAL_TRANSCRIPT_CACHE_TTL_SECONDS)
+
+# Video ID in watch?v=, youtu.be/, /embed/, /shorts/, /live/ and /v/ URLs, compiled
+# once so extracting it is a single search over the URL
+YOUTUBE_ID_PATTERN = re.compile(r'(?:[?&]v=|youtu\.be/|/(?:embed|shorts|live|v)/)([\w-]{11})(?![\w-])')
+BARE_YOUTUBE_ID_PATTERN = re.compile(r'[\w-]{11}')
+
+# fmt= parameter of a caption track URL (pytubefix hands out srv3 XML tracks)
+CAPTION_FORMAT_PATTERN = re.compile(r'fmt=[^&]*')
+
+# json3 caption events time themselves in milliseconds
+MS_TO_SECONDS = 1e-3
+
+# pytubefix's blocking player-response lookups run on their own pool, so a burst
+# of transcript fetches can't starve other users of the default executor
+YOUTUBE_EXECUTOR_WORKERS = 16
+_youtube_executor = ThreadPoolExecutor(max_workers=YOUTUBE_EXECUTOR_WORKERS, thread_name_prefix="yt-fetch")
+
+# Caption downloads that hit a transient failure (connection error, 429, 5xx) are
+# retried with jittered exponential backoff, within the fetch's time budget
+CAPTION_FETCH_MAX_ATTEMPTS = 3
+CAPTION_RETRY_BASE_DELAY = 1.0
+CAPTION_RETRY_MAX_DELAY = 30.0
+RETRYABLE_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+# Shared client for caption track downloads so fetches reuse pooled keep-alive
+# connections to YouTube instead of paying TCP + TLS setup on every video.
+# Timeouts are passed per request.
+YOUTUBE_HTTP_LIMITS = httpx.Limits(max_keepalive_connections=20, max_connections=100)
+# The async client can multiplex concurrent caption downloads over one HTTP/2
+# connection per host; it needs the optional h2 package (httpx[http2]) and can be
+# turned off with YOUTUBE_HTTP2=0
+try:
+    import h2  # noqa: F401
+    YOUTUBE_HTTP2 = os.getenv("YOUTUBE_HTTP2", "1") == "1"
+except ImportError:
+    YOUTUBE_HTTP2 = False
+_http_client: Optional[httpx.Client] = None
+_http_client_lock = threading.Lock()
+_async_http_client: Optional[httpx.AsyncClient] = None
+
+
+def _get_http_client() -> httpx.Client:
+    """
+    Returns the shared httpx client, creating it on first use.
+
+    fetch_transcript runs in worker threads, so creation is locked to keep
+    concurrent first callers from each building their own pool.
+    """
+    global _http_client
+    client = _http_client
+    if client is None or client.is_closed:
+        with _http_client_lock:
+            if _http_client is None or _http_client.is_closed:
+                _http_client = httpx.Client(limits=YOUTUBE_HTTP_LIMITS, proxy=Config.get_proxy_url())
+            client = _http_client
+    return client
+
+
+def _get_async_http_client() -> httpx.AsyncClient:
+    """
+    Returns the shared async httpx client used on the event loop, creating it on first use.
+    """
+    global _async_http_client
+    if _async_http_client is None or _async_http_client.is_closed:
+        _async_http_client = httpx.AsyncClient(limits=YOUTUBE_HTTP_LIMITS, proxy=Config.get_proxy_url(), http2=YOUTUBE_HTTP2)
+    return _async_http_client
+
+
+async def close_http_clients() -> None:
+    """
+    Closes the shared httpx clients. Called on application shutdown.
+    """
+    global _http_client, _async_http_client
+    with _http_client_lock:
+        if _http_client is not None:
+            _http_client.close()
+            _http_client = None
+    if _async_http_client is not None:
+        await _async_http_client.aclose()
+        _async_http_client = None
+
+
+
+async def get_transcript(video_id: str, timeout_limit: int = 30) -> Optional[List[Dict[str, Any]]]:
+    """
+    Return the transcript for a video, from the in-process or Redis cache when possible.
+
+    On a miss in both the transcript is fetched with fetch_transcript_async and stored
+    for TRANSCRIPT_CACHE_TTL_SECONDS (NO_CAPTIONS_CACHE_TTL_SECONDS if the video
+    has no captions). Cache errors never fail the request; they just fall
+    through to a fetch.
+
+    Args:
+        video_id: YouTube video ID
+        timeout_limit: Maximum time in seconds to spend fetching the transcript
+
+    Returns:
+        List of transcript entries (empty if the video has no captions) or None if failed
+    """
+    transcript = _local_transcript_cache.get(video_id)
+    if transcript is not None:
+        return transcript
+
+    transcript = await read_shared("get_cached_transcript", f"{TRANSCRIPT_CACHE_KEY_PREFIX}{video_id}")
+    if transcript is not None:
+        _local_transcript_cache[video_id] = transcript
+        return transcript
+
+    transcript = await fetch_transcript_async(video_id, timeout_limit)
+    if transcript is not None:
+        await _store_transcript(video_id, transcript)
+    return transcript
+
+
+async def _store_transcript(video_id: str, transcript: List[Dict[str, Any]]) -> None:
+    """
+    Store a freshly fetched transcript in the in-process and Redis caches.
+    An empty transcript (no captions) is kept for NO_CAPTIONS_CACHE_TTL_SECONDS.
+    Redis errors are logged and otherwise ignored.
+    """
+    _local_transcript_cache[video_id] = transcript
+    ttl = TRANSCRIPT_CACHE_TTL_SECONDS if transcript else NO_CAPTIONS_CACHE_TTL_SECONDS
+    await write_shared("cache_transcript", f"{TRANSCRIPT_CACHE_KEY_PREFIX}{video_id}", transcript, ttl)
+
+
 def fetch_transcript(video_id: str, timeout_limit: int = 30) -> Optional[List[Dict[str, Any]]]:
     """
     Fetch transcript using pytubefix with proper error handling and language preferences.
@@ -31,84 +217,239 @@ def fetch_transcript(video_id: str, timeout_limit: int = 30) -> Optional[List[Di
         timeout_limit: Maximum time in seconds to spend fetching the transcript
 
     Returns:
-        List of transcript entries or None if failed
+        List of transcript entries (empty if the video has no captions) or None if failed
     """
-    import time
-    import os
-    import platform
-    import socket
-    import traceback
-    from api.config import Config
-    import urllib.request
-
     start_time = time.time()
 
-    def time_left() -> bool:
-        elapsed = time.time() - start_time
-        return elapsed < timeout_limit
+    try:
+        caption = _select_caption(video_id, timeout_limit)
+        if caption is None:
+            return None
 
-    print(f"Fetching transcript for {video_id} using pytubefix, timeout limit: {timeout_limit}s")
+        # Download the track through the pooled client rather than pytubefix's
+        # one-shot urlopen, asking for json3 so entries come straight from its events
+        client = _get_http_client()
+        response = _get_caption(client, _caption_json_url(caption.url), start_time, timeout_limit)
+        transcript_entries = _parse_json3_to_transcript(response.content)
+        if transcript_entries is not None:
+            return transcript_entries
 
-    # Environment info logging
-    print(f"Environment info: platform={platform.platform()}, hostname={socket.gethostname()}, pid={os.getpid()}")
+        logger.warning("No json3 captions for %s, falling back to SRT", video_id)
+        response = _get_caption(client, caption.url, start_time, timeout_limit)
+        return parse_srt_to_transcript(caption.xml_caption_to_srt(response.text))
 
-    # Setup proxy if available
-    proxy_url = Config.get_proxy_url()
-    if proxy_url:
-        print(f"Using HTTP proxy: {proxy_url}")
-        proxy_handler = urllib.request.ProxyHandler({
-            'http': proxy_url,
-            'https': proxy_url
-        })
-        opener = urllib.request.build_opener(proxy_handler)
-        urllib.request.install_opener(opener)
-    else:
-        print("No HTTP proxy configured")
+    except ResourceNotFoundError:
+        return []
+    except Exception as e:
+        logger.exception("Error fetching transcript for %s: %s", video_id, e)
+        return None
 
-    try:
-        video_url = f"https://www.youtube.com/watch?v={video_id}"
-        from pytubefix import YouTube
-        from api.services.youtube import _parse_srt_to_transcript
 
-        yt = YouTube(video_url)
+async def fetch_transcript_async(video_id: str, timeout_limit: int = 30) -> Optional[List[Dict[str, Any]]]:
+    """
+    Async counterpart of fetch_transcript.
 
-        if not time_left():
-            print(f"Time limit reached while creating YouTube object")
-            return None
+    Only the pytubefix player-response lookup runs on the YouTube executor; the
+    caption download goes through the shared async client, so concurrent
+    fetches overlap their network waits on the event loop instead of each
+    holding a thread for the whole fetch.
 
-        print(f"DEBUG: Captions detected for video {video_id}: {list(yt.captions.keys())}")
+    Args:
+        video_id: YouTube video ID
+        timeout_limit: Maximum time in seconds to spend fetching the transcript
 
-        if not yt.captions:
-            print(f"No captions available for video {video_id}")
+    Returns:
+        List of transcript entries (empty if the video has no captions) or None if failed
+    """
+    start_time = time.time()
+
+    try:
+        loop = asyncio.get_running_loop()
+        caption = await loop.run_in_executor(_youtube_executor, _select_caption, video_id, timeout_limit)
+        if caption is None:
             return None
 
-        caption = None
+        client = _get_async_http_client()
+        response = await _get_caption_async(client, _caption_json_url(caption.url), start_time, timeout_limit)
+        transcript_entries = _parse_json3_to_transcript(response.content)
+        if transcript_entries is not None:
+            return transcript_entries
 
-        for lang in Config.TRANSCRIPT_LANGUAGES:
-            if lang in yt.captions:
-                caption = yt.captions[lang]
-                print(f"Found manual caption in preferred language: {lang}")
-                break
-            elif f"a.{lang}" in yt.captions:
-                caption = yt.captions[f"a.{lang}"]
-                print(f"Found auto-generated caption in preferred language: a.{lang}")
-                break
+        logger.warning("No json3 captions for %s, falling back to SRT", video_id)
+        response = await _get_caption_async(client, caption.url, start_time, timeout_limit)
+        return parse_srt_to_transcript(caption.xml_caption_to_srt(response.text))
 
-        if not caption:
-            caption_key = next(iter(yt.captions))
-            caption = yt.captions[caption_key]
-            print(f"Using first available caption: {caption_key}")
+    except ResourceNotFoundError:
+        return []
+    except Exception as e:
+        logger.exception("Error fetching transcript for %s: %s", video_id, e)
+        return None
 
-        srt_captions = caption.generate_srt_captions()
-        transcript_entries = _parse_srt_to_transcript(srt_captions)
 
-        return transcript_entries
+def _get_caption(client: httpx.Client, url: str, start_time: float, timeout_limit: int) -> httpx.Response:
+    """
+    GET a caption track, retrying transient failures with jittered backoff.
 
-    except Exception as e:
-        print(f"Error fetching transcript for {video_id}: {e}")
-        traceback.print_exc()
+    Args:
+        client: Shared httpx client
+        url: Caption track URL
+        start_time: When the fetch started, for the time budget
+        timeout_limit: The fetch's time budget in seconds
+
+    Returns:
+        The successful response
+
+    Raises:
+        httpx.HTTPError: If the download fails permanently, runs out of
+            attempts, or the next backoff would overrun the time budget
+    """
+    retry = _CaptionRetry(start_time, timeout_limit)
+    while True:
+        try:
+            return retry.check(client.get(url, timeout=retry.timeout()))
+        except httpx.HTTPError as e:
+            time.sleep(retry.backoff(e))
+
+
+async def _get_caption_async(client: httpx.AsyncClient, url: str, start_time: float, timeout_limit: int) -> httpx.Response:
+    """
+    Async counterpart of _get_caption.
+    """
+    retry = _CaptionRetry(start_time, timeout_limit)
+    while True:
+        try:
+            return retry.check(await client.get(url, timeout=retry.timeout()))
+        except httpx.HTTPError as e:
+            await asyncio.sleep(retry.backoff(e))
+
+
+class _CaptionRetry:
+    """
+    Retry policy for one caption download, shared by _get_caption and
+    _get_caption_async so only the transport call differs between them.
+
+    Only connection errors and 429/5xx responses are retried; anything else
+    (e.g. 403/404 for a removed track) will not get better by asking again.
+    """
+
+    def __init__(self, start_time: float, timeout_limit: int):
+        self.start_time = start_time
+        self.timeout_limit = timeout_limit
+        self.attempt = 0
+
+    def timeout(self) -> float:
+        """Timeout for the next request: whatever is left of the time budget."""
+        return _time_remaining(self.start_time, self.timeout_limit)
+
+    def check(self, response: httpx.Response) -> httpx.Response:
+        """Returns a successful response; raises httpx.HTTPStatusError otherwise."""
+        response.raise_for_status()
+        return response
+
+    def backoff(self, error: httpx.HTTPError) -> float:
+        """
+        Seconds to wait before retrying after error. Re-raises error if the
+        download should not be retried: a permanent failure, no attempts left,
+        or a backoff that would overrun the time budget.
+        """
+        self.attempt += 1
+        transient = isinstance(error, httpx.TransportError) or (
+            isinstance(error, httpx.HTTPStatusError) and error.response.status_code in RETRYABLE_STATUS_CODES
+        )
+        if not transient or self.attempt >= CAPTION_FETCH_MAX_ATTEMPTS:
+            raise error
+
+        delay = min(CAPTION_RETRY_MAX_DELAY, CAPTION_RETRY_BASE_DELAY * (2 ** (self.attempt - 1)))
+        delay *= 1 + random.random() * 0.5
+        if delay >= self.timeout_limit - (time.time() - self.start_time):
+            raise error
+        logger.warning(
+            "Caption download failed (attempt %d/%d), retrying in %.1fs: %s",
+            self.attempt, CAPTION_FETCH_MAX_ATTEMPTS, delay, error
+        )
+        return delay
+
+
+def _caption_json_url(caption_url: str) -> str:
+    """
+    Return the caption track URL with its format switched to json3.
+    """
+    if CAPTION_FORMAT_PATTERN.search(caption_url):
+        return CAPTION_FORMAT_PATTERN.sub('fmt=json3', caption_url)
+    return f"{caption_url}&fmt=json3"
+
+
+def _time_remaining(start_time: float, timeout_limit: int) -> float:
+    """
+    Seconds left of a fetch's time budget, never less than one so a late
+    download still gets a usable timeout.
+    """
+    return max(1.0, timeout_limit - (time.time() - start_time))
+
+
+def _select_caption(video_id: str, timeout_limit: int):
+    """
+    Load a video's player response with pytubefix and pick its caption track.
+
+    This is the blocking part of a transcript fetch; callers download and
+    parse the returned track themselves.
+
+    Args:
+        video_id: YouTube video ID
+        timeout_limit: Maximum time in seconds to spend loading the video
+
+    Returns:
+        The caption track in the first preferred language, else the first
+        available one, or None if time ran out
+
+    Raises:
+        ResourceNotFoundError: If the video has no captions
+    """
+    start_time = time.time()
+
+    def time_left() -> bool:
+        elapsed = time.time() - start_time
+        return elapsed < timeout_limit
+
+    logger.debug("Fetching transcript for %s using pytubefix, timeout limit: %ss", video_id, timeout_limit)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Environment info: %s", _environment_info())
+
+    if PROXY_OPENER_INSTALLED:
+        logger.debug("Using HTTP proxy %s:%s", Config.DECODO_HOST, Config.DECODO_PORT)
+    else:
+        logger.debug("No HTTP proxy configured")
+
+    video_url = f"https://www.youtube.com/watch?v={video_id}"
+    yt = YouTube(video_url)
+
+    if not time_left():
+        logger.warning("Time limit reached while creating YouTube object for %s", video_id)
         return None
 
+    # yt.captions rebuilds its track list from the player response on every
+    # access, so read it once into a plain dict and look languages up there
+    caption_query = yt.captions
+    captions = {code: caption_query[code] for code in caption_query.keys()}
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Captions detected for video %s: %s", video_id, list(captions))
+
+    if not captions:
+        logger.info("No captions available for video %s", video_id)
+        raise ResourceNotFoundError("Captions", video_id)
+
+    for lang, auto_lang in TRANSCRIPT_LANGUAGE_CODES:
+        if lang in captions:
+            logger.debug("Found manual caption in preferred language: %s", lang)
+            return captions[lang]
+        elif auto_lang in captions:
+            logger.debug("Found auto-generated caption in preferred language: %s", auto_lang)
+            return captions[auto_lang]
+
+    caption_key = next(iter(captions))
+    logger.debug("Using first available caption: %s", caption_key)
+    return captions[caption_key]
+
 
 async def extract_youtube_transcript(state):
     """
@@ -120,15 +461,10 @@ async def extract_youtube_transcript(state):
     Returns:
         Dictionary with content, title, and metadata including video_id and transcript
     """
-    from api.services.openai_service import generate_chapters_with_openai
-    from api.utils.transcript import format_transcript_for_model
-    import logging
-
     assert state.url, "No URL provided"
     logging.warning(f"Extracting transcript from URL: {state.url}")
-    languages = Config.TRANSCRIPT_LANGUAGES
 
-    video_id = await _extract_youtube_id(state.url)
+    video_id = _extract_youtube_id(state.url)
 
     try:
         title = await get_video_title(video_id)
@@ -137,21 +473,20 @@ async def extract_youtube_transcript(state):
         logging.exception(e)
         title = ""
 
-    transcript_result = fetch_transcript(video_id)
-    if not transcript_result:
+    # fetch_transcript already returns parsed entries; get_transcript runs it off the event loop
+    transcript_entries = await get_transcript(video_id)
+    if not transcript_entries:
         logging.error(f"Failed to fetch transcript for video_id: {video_id}")
         return None
 
-    transcript_text, srt_captions = transcript_result
-
-    # Parse SRT captions to structured transcript entries
-    transcript_entries = _parse_srt_to_transcript(srt_captions)
+    transcript_text = " ".join(entry['text'] for entry in transcript_entries)
 
     # Format transcript entries for model input
     formatted_transcript = format_transcript_for_model(transcript_entries)[0]
 
-    # Estimate video duration from transcript or set default
-    video_duration_minutes = 60
+    # Estimate video duration from transcript
+    last_entry = transcript_entries[-1]
+    video_duration_minutes = (last_entry['start'] + last_entry['duration']) / 60
 
     system_prompt = create_chapter_prompt(video_duration_minutes)
 
@@ -169,77 +504,74 @@ async def extract_youtube_transcript(state):
     }
 
 
-def _parse_srt_to_transcript(srt_content: str) -> List[Dict[str, Any]]:
+def _extract_youtube_id(url: str) -> str:
     """
-    Parse SRT format captions to our expected transcript format.
+    Extract the 11-character video ID from a YouTube URL or a bare ID.
 
     Args:
-        srt_content: SRT formatted caption content
+        url: YouTube video URL in any of the common forms, or the ID itself
 
     Returns:
-        List of transcript entries with text, start, and duration
-    """
-    transcript_entries = []
+        The video ID
 
-    # Split SRT content into blocks
-    blocks = srt_content.strip().split('\n\n')
-
-    for block in blocks:
-        lines = block.strip().split('\n')
-        if len(lines) < 3:
-            continue
-
-        try:
-            # Parse timestamp line (format: 00:00:01,000 --> 00:00:04,000)
-            timestamp_line = lines[1]
-            start_time_str, end_time_str = timestamp_line.split(' --> ')
-
-            # Convert timestamp to seconds
-            start_seconds = _timestamp_to_seconds(start_time_str)
-            end_seconds = _timestamp_to_seconds(end_time_str)
-            duration = end_seconds - start_seconds
-
-            # Get text content (everything after the timestamp line)
-            text = ' '.join(lines[2:]).strip()
-
-            # Clean up text (remove HTML tags if any)
-            text = re.sub(r'<[^>]+>', '', text)
-
-            if text:  # Only add if there's actual text
-                transcript_entries.append({
-                    'text': text,
-                    'start': start_seconds,
-                    'duration': duration
-                })
-
-        except (ValueError, IndexError) as e:
-            print(f"Error parsing SRT block: {e}")
-            continue
-
-    return transcript_entries
+    Raises:
+        ValidationError: If no video ID can be found
+    """
+    url = url.strip()
+    if BARE_YOUTUBE_ID_PATTERN.fullmatch(url):
+        return url
+    match = YOUTUBE_ID_PATTERN.search(url)
+    if not match:
+        raise ValidationError(f"Could not extract a YouTube video ID from URL: {url}")
+    return match.group(1)
 
 
-def _timestamp_to_seconds(timestamp: str) -> float:
+def _parse_json3_to_transcript(content: bytes) -> Optional[List[Dict[str, Any]]]:
     """
-    Convert SRT timestamp format (HH:MM:SS,mmm) to seconds.
+    Build transcript entries from a json3 caption track.
+
+    Each event carries its start and duration in milliseconds and its text as
+    segments, so no SRT formatting or parsing is needed.
 
     Args:
-        timestamp: Timestamp in format HH:MM:SS,mmm
+        content: Raw json3 response body
 
     Returns:
-        Time in seconds as float
+        List of transcript entries with text, start, and duration, or None if
+        the body is not json3
     """
-    # Replace comma with dot for milliseconds
-    timestamp = timestamp.replace(',', '.')
+    try:
+        data = orjson.loads(content)
+    except orjson.JSONDecodeError:
+        return None
+    if not isinstance(data, dict) or not isinstance(data.get('events'), list):
+        return None
+
+    # Keep only the events (dropping pens and window styles now), and release
+    # each event as it is converted, so a long video's parsed track and its
+    # entries are never both fully held in memory
+    events = data.pop('events')
+    del data
+    events.reverse()
 
-    # Split into time parts
-    time_parts = timestamp.split(':')
-    hours = int(time_parts[0])
-    minutes = int(time_parts[1])
-    seconds_and_ms = float(time_parts[2])
+    transcript_entries = []
+    append = transcript_entries.append
+    pop = events.pop
+    while events:
+        event = pop()
+        segs = event.get('segs')
+        if not segs or 'tStartMs' not in event:
+            continue
 
-    total_seconds = hours * 3600 + minutes * 60 + seconds_and_ms
-    return total_seconds
+        text = ''.join([seg['utf8'] for seg in segs if 'utf8' in seg]).replace('\n', ' ').strip()
+        if text:
+            append({
+                'text': text,
+                'start': event['tStartMs'] * MS_TO_SECONDS,
+                'duration': event.get('dDurationMs', 0) * MS_TO_SECONDS
+            })
+
+    return transcript_entries
 
 
 # Legacy function removed - now using pytubefix for all transcript fetching
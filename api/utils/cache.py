@@ -1,28 +1,235 @@
 """
-Simple in-memory cache implementation for chapter data
+Chapter data cache: shared across instances through Redis, with an
+in-process cache in front of it. The Redis helpers (read_shared/write_shared)
+are also used by the transcript cache, so both store values the same way.
 """
-from typing import Dict, Any, Optional
+import asyncio
+import base64
+import logging
+import sys
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Any, Optional, TypeVar
 
-# Global cache for chapters
-CHAPTERS_CACHE: Dict[str, Dict[str, str]] = {}
+import orjson
+from cachetools import TLRUCache
 
-def get_from_cache(video_id: str) -> Optional[Dict[str, str]]:
+from ..config import Config
+from .db import redis_operation
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True, slots=True)
+class ChapterEntry:
+    """
+    A video's cached chapters and the transcript they were generated from.
+    Stored in Redis as a JSON object with the same two fields.
+    """
+    chapters: str
+    transcript: Any
+
+# Serverless instances each start with an empty in-process cache, so chapters
+# are also stored in Redis where every instance can reuse them
+CHAPTERS_CACHE_KEY_PREFIX = "chapters:"
+# Shared copies are zlib-compressed (transcripts are repetitive text and shrink
+# several-fold) and base64-encoded, since Upstash values are strings
+COMPRESSED_VALUE_MARKER = "z:"
+COMPRESSION_LEVEL = 6
+
+# Global cache for chapters, bounded in size and age so long-lived workers
+# don't grow without limit or serve stale chapters forever. Entries carry the
+# whole transcript, so the bound is entries * transcript size; the least
+# recently used entry is evicted once it is full.
+CHAPTERS_CACHE_MAX_SIZE = Config.CHAPTERS_CACHE_MAX_SIZE
+CHAPTERS_CACHE_TTL_SECONDS = 60 * 60 * 24
+# Segmented LRU: new entries start in a small probation segment and move to the
+# protected segment (CHAPTERS_CACHE) on their first hit, so a burst of one-off
+# videos only churns probation and can't evict entries people keep coming back to
+CHAPTERS_CACHE_PROBATION_SIZE = max(1, CHAPTERS_CACHE_MAX_SIZE // 5)
+# Values are (expires_at, entry) pairs: each entry keeps the expiry it was added
+# with as it moves between segments, instead of restarting its TTL on every move
+def _entry_expiry(_video_id, value, _now) -> float:
+    return value[0]
+
+CHAPTERS_CACHE: TLRUCache = TLRUCache(
+    maxsize=max(1, CHAPTERS_CACHE_MAX_SIZE - CHAPTERS_CACHE_PROBATION_SIZE), ttu=_entry_expiry, timer=time.monotonic
+)
+_probation_cache = TLRUCache(maxsize=CHAPTERS_CACHE_PROBATION_SIZE, ttu=_entry_expiry, timer=time.monotonic)
+# The caches are not thread-safe, and reads also evict expired entries
+_cache_lock = threading.RLock()
+
+# Lookup counters, for observability
+_cache_stats = {"hits": 0, "misses": 0, "shared_hits": 0}
+
+# Computations in progress, by key, for get_or_compute
+_inflight: Dict[str, asyncio.Future] = {}
+
+T = TypeVar("T")
+
+async def get_from_cache(video_id: str) -> Optional[ChapterEntry]:
     """
-    Get cached data for a video ID. Returns a dict with keys 'chapters' and 'transcript'.
-    
+    Get cached data for a video ID, as a ChapterEntry with chapters and transcript.
+
+    The in-process cache is checked first; on a miss the shared Redis copy is
+    read and kept locally. Redis errors are logged and treated as a miss.
+
     Args:
         video_id: YouTube video ID
-        
+
     Returns:
         Cached data or None if not found
     """
-    return CHAPTERS_CACHE.get(video_id)
+    # Each request parses its own copy of the ID; interned, it matches a cached
+    # video's stored key by identity instead of by comparing the strings
+    video_id = sys.intern(video_id)
+    entry = _get_local(video_id)
+    if entry is not None:
+        return entry
+
+    data = await read_shared("get_cached_chapters", f"{CHAPTERS_CACHE_KEY_PREFIX}{video_id}")
+    if data is None:
+        return None
+
+    entry = ChapterEntry(data['chapters'], data['transcript'])
+    _add_local(video_id, entry)
+    with _cache_lock:
+        _cache_stats["shared_hits"] += 1
+    return entry
+
+async def add_to_cache(video_id: str, chapters: str, transcript: Any) -> None:
+    """
+    Add chapters and the transcript (not concatenated prompt) to cache for a video ID,
+    both in-process and in Redis for CHAPTERS_CACHE_TTL_SECONDS.
+    """
+    video_id = sys.intern(video_id)
+    entry = ChapterEntry(chapters, transcript)
+    _add_local(video_id, entry)
+    # orjson serializes the dataclass as a {'chapters', 'transcript'} object
+    await write_shared("cache_chapters", f"{CHAPTERS_CACHE_KEY_PREFIX}{video_id}", entry, CHAPTERS_CACHE_TTL_SECONDS)
+
+async def get_or_compute(key: str, compute: Callable[[], Awaitable[T]]) -> T:
+    """
+    Single-flight: runs compute() for a key only if it isn't already running.
+    Concurrent callers for the same key wait for and share the first caller's
+    result (or exception), so a burst of misses for one video does the
+    expensive work once.
+
+    compute() runs in its own task that every caller, the first included,
+    awaits through asyncio.shield: a caller being cancelled (e.g. its client
+    disconnected) never cancels the shared work or fails the other callers.
+
+    Args:
+        key: Identifies the computation, e.g. a video ID
+        compute: Coroutine function producing the value
+
+    Returns:
+        The value computed by the shared task
+    """
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(compute())
+        _inflight[key] = task
+        task.add_done_callback(lambda done: _finish_inflight(key, done))
+    return await asyncio.shield(task)
+
+def _finish_inflight(key: str, task: asyncio.Future) -> None:
+    """
+    Forgets a finished computation so the next miss starts a fresh one.
+    """
+    if _inflight.get(key) is task:
+        del _inflight[key]
+    # Marks the exception as retrieved when every caller was cancelled
+    if not task.cancelled():
+        task.exception()
+
+async def read_shared(operation_name: str, key: str) -> Optional[Any]:
+    """
+    Reads a value stored with write_shared from Redis.
+
+    Args:
+        operation_name: Name of the Redis operation for logging
+        key: Redis key
+
+    Returns:
+        The decoded value, or None if the key is missing or Redis could not be
+        read (errors are logged, never raised)
+    """
+    try:
+        cached = await redis_operation(operation_name, _get_shared, key, idempotent=True)
+    except Exception as e:
+        logger.warning("Could not read %s from Redis: %s", key, e)
+        return None
+    return decode_shared(cached) if cached else None
+
+async def write_shared(operation_name: str, key: str, value: Any, ttl: int) -> None:
+    """
+    Stores a JSON-serializable value in Redis for ttl seconds, compressed.
+    Errors are logged, never raised.
+    """
+    try:
+        await redis_operation(operation_name, _set_shared, key, _encode_shared(value), ttl, idempotent=True)
+    except Exception as e:
+        logger.warning("Could not write %s to Redis: %s", key, e)
+
+def _encode_shared(value: Any) -> str:
+    """
+    Serializes and compresses a value for Redis.
+    """
+    compressed = zlib.compress(orjson.dumps(value), COMPRESSION_LEVEL)
+    return COMPRESSED_VALUE_MARKER + base64.b64encode(compressed).decode()
+
+def decode_shared(value: str) -> Any:
+    """
+    Reverses _encode_shared. Uncompressed JSON values are read as-is.
+    """
+    if value.startswith(COMPRESSED_VALUE_MARKER):
+        return orjson.loads(zlib.decompress(base64.b64decode(value[len(COMPRESSED_VALUE_MARKER):])))
+    return orjson.loads(value)
+
+async def _get_shared(redis, key: str):
+    return await redis.get(key)
+
+async def _set_shared(redis, key: str, value: str, ttl: int):
+    return await redis.set(key, value, ex=ttl)
+
+def _get_local(video_id: str) -> Optional[ChapterEntry]:
+    """
+    Looks a video up in the in-process segmented cache.
+    """
+    with _cache_lock:
+        value = CHAPTERS_CACHE.get(video_id)
+        if value is None:
+            value = _probation_cache.pop(video_id, None)
+            if value is not None:
+                # Second sighting: promote, demoting the protected segment's
+                # least recently used entry to probation if it is full
+                if len(CHAPTERS_CACHE) >= CHAPTERS_CACHE.maxsize:
+                    demoted_id, demoted = CHAPTERS_CACHE.popitem()
+                    _probation_cache[demoted_id] = demoted
+                CHAPTERS_CACHE[video_id] = value
+        if value is None:
+            _cache_stats["misses"] += 1
+            return None
+        _cache_stats["hits"] += 1
+        return value[1]
+
+def _add_local(video_id: str, entry: ChapterEntry) -> None:
+    """
+    Stores an entry in the in-process segmented cache, expiring after CHAPTERS_CACHE_TTL_SECONDS.
+    """
+    value = (time.monotonic() + CHAPTERS_CACHE_TTL_SECONDS, entry)
+    with _cache_lock:
+        if video_id in CHAPTERS_CACHE:
+            CHAPTERS_CACHE[video_id] = value
+        else:
+            _probation_cache[video_id] = value
 
-def add_to_cache(video_id: str, chapters: str, transcript: str) -> None:
+def get_cache_stats() -> Dict[str, Any]:
     """
-    Add chapters and the transcript (not concatenated prompt) to cache for a video ID.
+    Returns the in-process chapter cache's size and hit/miss counts, plus how
+    many of its misses were served from Redis.
     """
-    CHAPTERS_CACHE[video_id] = {
-        'chapters': chapters,
-        'transcript': transcript
-    }
+    with _cache_lock:
+        return {"size": len(CHAPTERS_CACHE) + len(_probation_cache), **_cache_stats}
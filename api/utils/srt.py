@@ -0,0 +1,116 @@
+"""
+SRT caption parsing utilities
+"""
+import logging
+import re
+from functools import lru_cache
+from typing import List, Dict, Any, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+# SRT cue markup and HH:MM:SS,mmm timestamps, compiled once for the per-block parse loop
+SRT_TAG_PATTERN = re.compile(r'<[^>]+>')
+SRT_TIMESTAMP_PATTERN = re.compile(r'(\d+):(\d{2}):(\d{2})[,.](\d{3})')
+
+
+def parse_srt_to_transcript(srt_content: str) -> List[Dict[str, Any]]:
+    """
+    Parse SRT format captions to our expected transcript format.
+
+    Args:
+        srt_content: SRT formatted caption content
+
+    Returns:
+        List of transcript entries with text, start, and duration
+    """
+    # A single comprehension lets CPython build the list with its dedicated
+    # append opcode instead of a method call per cue
+    return [entry for block in iter_srt_blocks(srt_content) if (entry := parse_srt_block(block)) is not None]
+
+
+def parse_srt_block(block: str) -> Optional[Dict[str, Any]]:
+    """
+    Parse one SRT block (index, timestamp line, text lines) into a transcript entry.
+
+    Args:
+        block: A single SRT block
+
+    Returns:
+        Transcript entry with text, start, and duration, or None if the block
+        is malformed or has no text
+    """
+    lines = block.strip().splitlines()
+    line_count = len(lines)
+    if line_count < 3:
+        return None
+
+    try:
+        # Parse timestamp line (format: 00:00:01,000 --> 00:00:04,000)
+        start_time_str, end_time_str = lines[1].split(' --> ')
+
+        # Convert timestamp to seconds
+        start_seconds = timestamp_to_seconds(start_time_str)
+        end_seconds = timestamp_to_seconds(end_time_str)
+    except ValueError as e:
+        logger.debug("Error parsing SRT block: %s", e)
+        return None
+
+    # Get text content (everything after the timestamp line); most
+    # cues are a single line, which needs no slice or join
+    text = lines[2] if line_count == 3 else ' '.join(lines[2:])
+
+    # Clean up text (remove HTML tags if any); most cues have none,
+    # so skip the regex unless there is a tag to strip
+    if '<' in text:
+        text = SRT_TAG_PATTERN.sub('', text)
+    text = text.strip()
+
+    if not text:
+        return None
+    return {
+        'text': text,
+        'start': start_seconds,
+        'duration': end_seconds - start_seconds
+    }
+
+
+def iter_srt_blocks(srt_content: str) -> Iterator[str]:
+    """
+    Yield the blank-line separated blocks of SRT content one at a time.
+
+    Slicing each block out as it is reached avoids copying the whole caption
+    text with strip() and holding every block in a list before parsing starts.
+
+    Args:
+        srt_content: SRT formatted caption content
+
+    Yields:
+        Each block's text, possibly empty or surrounded by whitespace
+    """
+    find = srt_content.find
+    end = len(srt_content)
+    pos = 0
+    while pos < end:
+        sep = find('\n\n', pos)
+        if sep == -1:
+            sep = end
+        yield srt_content[pos:sep]
+        pos = sep + 2
+
+
+@lru_cache(maxsize=8192)
+def timestamp_to_seconds(timestamp: str) -> float:
+    """
+    Convert SRT timestamp format (HH:MM:SS,mmm) to seconds.
+
+    Args:
+        timestamp: Timestamp in format HH:MM:SS,mmm
+
+    Returns:
+        Time in seconds as float
+    """
+    match = SRT_TIMESTAMP_PATTERN.fullmatch(timestamp.strip())
+    if not match:
+        raise ValueError(f"Invalid SRT timestamp: {timestamp!r}")
+    hours, minutes, seconds, millis = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + int(seconds) + int(millis) / 1000
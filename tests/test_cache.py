@@ -0,0 +1,79 @@
+"""
+Test the chapter cache's request coalescing
+"""
+import asyncio
+
+from api.utils import cache
+
+
+def test_get_or_compute_shares_one_computation():
+    """Concurrent callers for a key run compute() once and share its result"""
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "chapters"
+
+    async def run():
+        return await asyncio.gather(*[cache.get_or_compute("video", compute) for _ in range(5)])
+
+    assert asyncio.run(run()) == ["chapters"] * 5
+    assert len(calls) == 1
+    assert "video" not in cache._inflight
+
+
+def test_get_or_compute_survives_first_caller_cancellation():
+    """Cancelling the caller that started compute() neither cancels it nor fails the others"""
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.02)
+        return "chapters"
+
+    async def run():
+        first = asyncio.ensure_future(cache.get_or_compute("video", compute))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(cache.get_or_compute("video", compute))
+        await asyncio.sleep(0)
+        first.cancel()
+        result = await second
+        return first.cancelled(), result
+
+    first_cancelled, result = asyncio.run(run())
+    assert first_cancelled
+    assert result == "chapters"
+    assert len(calls) == 1
+    assert "video" not in cache._inflight
+
+
+def test_get_or_compute_shares_errors_then_retries():
+    """A failed computation fails every waiter and is not reused by the next call"""
+    attempts = []
+
+    async def compute():
+        attempts.append(1)
+        await asyncio.sleep(0.01)
+        if len(attempts) == 1:
+            raise RuntimeError("transcript unavailable")
+        return "chapters"
+
+    async def run():
+        failures = await asyncio.gather(
+            *[cache.get_or_compute("video", compute) for _ in range(3)], return_exceptions=True
+        )
+        retried = await cache.get_or_compute("video", compute)
+        return failures, retried
+
+    failures, retried = asyncio.run(run())
+    assert all(isinstance(failure, RuntimeError) for failure in failures)
+    assert retried == "chapters"
+    assert len(attempts) == 2
+
+
+if __name__ == "__main__":
+    test_get_or_compute_shares_one_computation()
+    test_get_or_compute_survives_first_caller_cancellation()
+    test_get_or_compute_shares_errors_then_retries()
+    print("All tests passed!")
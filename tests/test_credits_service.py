@@ -0,0 +1,54 @@
+"""
+Test transaction paging
+"""
+import asyncio
+
+import orjson
+
+from api.services import credits_service
+
+TYPES = ("purchase", "subscription_renewal", "deduction")
+
+
+class _TransactionLog:
+    """Serves LRANGE over a transaction log and fails on anything else"""
+    def __init__(self, transactions):
+        self.entries = [orjson.dumps(t).decode() for t in transactions]
+
+    async def lrange(self, key, start, end):
+        return self.entries[start:end + 1]
+
+
+def test_subset_of_purchase_types_pages_through_the_log():
+    """A filter for one purchase type returns full, consecutive pages of that type only"""
+    # Newest first, as LPUSH leaves them
+    transactions = [
+        {"timestamp": f"2024-01-01T00:00:{i:02d}", "amount": 1, "type": TYPES[i % 3], "description": str(i)}
+        for i in range(250)
+    ]
+    redis = _TransactionLog(transactions)
+
+    async def _fake_redis_operation(operation_name, operation_func, *args, **kwargs):
+        return await operation_func(redis, *args)
+
+    original_redis_operation = credits_service.redis_operation
+    credits_service.redis_operation = _fake_redis_operation
+    try:
+        pages = [
+            asyncio.run(credits_service.get_transactions_page("user-1", offset=offset, limit=20, types=("purchase",)))
+            for offset in range(0, 100, 20)
+        ]
+    finally:
+        credits_service.redis_operation = original_redis_operation
+
+    purchases = [t for t in transactions if t["type"] == "purchase"]
+    assert len(purchases) == 84
+    for page_number, page in enumerate(pages):
+        assert page == purchases[page_number * 20:(page_number + 1) * 20]
+    # The last page is the only short one
+    assert [len(page) for page in pages] == [20, 20, 20, 20, 4]
+
+
+if __name__ == "__main__":
+    test_subset_of_purchase_types_pages_through_the_log()
+    print("All tests passed!")
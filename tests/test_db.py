@@ -0,0 +1,91 @@
+"""
+Test Redis operation reconnects
+"""
+import asyncio
+
+import httpx
+
+from api.utils import db
+from api.utils.exceptions import RedisOperationError
+
+
+class _Client:
+    """Stands in for the Upstash client; only identity matters here"""
+    def __init__(self, name):
+        self.name = name
+
+
+def _run_with_clients(operation_func, **kwargs):
+    """
+    Runs operation_func through redis_operation with a failing shared client
+    and a replacement that reconnecting returns.
+    """
+    failing, replacement = _Client("failing"), _Client("replacement")
+
+    async def _fake_ensure_redis_connection():
+        db.redis_async_client = replacement
+        return replacement
+
+    original_client = db.redis_async_client
+    original_ensure = db._ensure_redis_connection
+    db.redis_async_client = failing
+    db._ensure_redis_connection = _fake_ensure_redis_connection
+    try:
+        return asyncio.run(db.redis_operation("test_operation", operation_func, **kwargs)), db.redis_async_client
+    finally:
+        db.redis_async_client = original_client
+        db._ensure_redis_connection = original_ensure
+
+
+def test_idempotent_operation_reconnects_and_retries():
+    """A transport error drops the client and an idempotent operation runs again on a new one"""
+    calls = []
+
+    async def _get(redis):
+        calls.append(redis.name)
+        if redis.name == "failing":
+            raise httpx.ReadError("connection reset")
+        return "value"
+
+    result, client = _run_with_clients(_get, idempotent=True)
+    assert result == "value"
+    assert calls == ["failing", "replacement"]
+    assert client.name == "replacement"
+
+
+def test_non_idempotent_operation_is_not_replayed():
+    """A command that may have reached Upstash is not sent again unless marked idempotent"""
+    calls = []
+
+    async def _incr(redis):
+        calls.append(redis.name)
+        raise httpx.ReadError("connection reset")
+
+    try:
+        _run_with_clients(_incr)
+        assert False, "Expected RedisOperationError"
+    except RedisOperationError:
+        pass
+    assert calls == ["failing"]
+
+
+def test_unsent_request_is_retried():
+    """A request that never left the client is retried even if not idempotent"""
+    calls = []
+
+    async def _incr(redis):
+        calls.append(redis.name)
+        if redis.name == "failing":
+            raise httpx.ConnectError("connection refused")
+        return 1
+
+    result, _ = _run_with_clients(_incr)
+    assert result == 1
+    assert calls == ["failing", "replacement"]
+
+
+if __name__ == "__main__":
+    test_idempotent_operation_reconnects_and_retries()
+    test_non_idempotent_operation_is_not_replayed()
+    test_unsent_request_is_retried()
+    print("All tests passed!")
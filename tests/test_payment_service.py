@@ -0,0 +1,83 @@
+"""
+Test Stripe webhook deduplication
+"""
+import asyncio
+
+from api.services import payment_service
+from api.utils.exceptions import RedisOperationError
+
+PRICE_ID = "price_1RHh4dF7Kryr2ZRbrm1f0zt4"
+
+EVENT = {
+    "id": "evt_1",
+    "type": "checkout.session.completed",
+    "data": {"object": {
+        "client_reference_id": "user-1",
+        "mode": "payment",
+        "metadata": {"price_id": PRICE_ID},
+    }},
+}
+
+
+class _SeenKeys:
+    """Serves the SET NX / DEL calls used to claim and release events"""
+    def __init__(self):
+        self.keys = set()
+
+    async def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.keys:
+            return None
+        self.keys.add(key)
+        return True
+
+    async def delete(self, key):
+        present = key in self.keys
+        self.keys.discard(key)
+        return int(present)
+
+
+def test_failed_webhook_is_released_and_redelivery_handled_once():
+    """A failed event is released so its redelivery runs, and is skipped once handled"""
+    redis = _SeenKeys()
+    grants = []
+    add_credits_results = [None, 15]
+
+    async def _fake_redis_operation(operation_name, operation_func, *args, **kwargs):
+        return await operation_func(redis, *args)
+
+    async def _fake_add_credits(user_id, amount, transaction_type, description):
+        grants.append((user_id, amount))
+        return add_credits_results.pop(0)
+
+    original_redis_operation = payment_service.redis_operation
+    original_add_credits = payment_service.credits_service.add_credits
+    payment_service.redis_operation = _fake_redis_operation
+    payment_service.credits_service.add_credits = _fake_add_credits
+    try:
+        seen_key = f"{payment_service.WEBHOOK_EVENT_SEEN_KEY_PREFIX}evt_1"
+
+        # add_credits fails: the error reaches the route and the claim is dropped
+        try:
+            asyncio.run(payment_service.handle_webhook_event(EVENT))
+            assert False, "Expected RedisOperationError"
+        except RedisOperationError:
+            pass
+        assert seen_key not in redis.keys
+
+        # Stripe's redelivery is handled and claims the event
+        asyncio.run(payment_service.handle_webhook_event(EVENT))
+        assert seen_key in redis.keys
+
+        # Any further delivery is a duplicate
+        asyncio.run(payment_service.handle_webhook_event(EVENT))
+    finally:
+        payment_service.redis_operation = original_redis_operation
+        payment_service.credits_service.add_credits = original_add_credits
+
+    credits = payment_service.STRIPE_PRICE_ID_TO_CREDITS[PRICE_ID]
+    assert grants == [("user-1", credits), ("user-1", credits)]
+
+
+if __name__ == "__main__":
+    test_failed_webhook_is_released_and_redelivery_handled_once()
+    print("All tests passed!")
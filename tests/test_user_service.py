@@ -0,0 +1,115 @@
+"""
+Test the user service
+"""
+import asyncio
+from datetime import datetime, timezone
+
+import orjson
+
+from api.models.user import User
+from api.services import user_service
+
+
+def _make_user(**overrides):
+    user_data = {
+        "id": "user-1",
+        "email": "jane@example.com",
+        "name": "Jane",
+        "google_id": "google-1",
+        "created_at": datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone.utc),
+        "picture": "https://example.com/a/b.png",
+        "stripe_customer_id": "cus_old",
+    }
+    user_data.update(overrides)
+    return User(**user_data)
+
+
+class _RecordingRedis:
+    """Serves one stored user and records the patch script calls"""
+    def __init__(self, stored_json):
+        self.stored_json = stored_json
+        self.evals = []
+
+    async def get(self, key):
+        return self.stored_json if key == "user:user-1" else None
+
+    async def eval(self, script, keys, args):
+        self.evals.append((keys, args))
+        return 1
+
+
+def test_patch_user_fields_stores_pydantic_json():
+    """The patch writes the same JSON save_user would and declares every key it touches"""
+    stored_user = _make_user()
+    redis = _RecordingRedis(stored_user.model_dump_json())
+
+    async def _fake_redis_operation(operation_name, operation_func, *args, **kwargs):
+        return await operation_func(redis, *args)
+
+    original_redis_operation = user_service.redis_operation
+    user_service.redis_operation = _fake_redis_operation
+    try:
+        patched = asyncio.run(user_service.patch_user_fields(
+            "user-1", {"stripe_customer_id": "cus_new", "stripe_subscription_id": "sub_1"}
+        ))
+    finally:
+        user_service.redis_operation = original_redis_operation
+        user_service._user_cache.clear()
+        user_service._google_id_cache.clear()
+
+    assert len(redis.evals) == 1
+    keys, args = redis.evals[0]
+    expected_user, stored_json = args[0], args[1]
+    assert expected_user == stored_user.model_dump_json()
+
+    # Same serializer as save_user: model field order, "/" left unescaped
+    assert stored_json == _make_user(stripe_customer_id="cus_new", stripe_subscription_id="sub_1").model_dump_json()
+    assert list(orjson.loads(stored_json)) == list(User.model_fields)
+    assert "\\/" not in stored_json
+    assert patched.stripe_customer_id == "cus_new"
+
+    # Every key the script reads or writes is declared
+    assert keys == [
+        "user:user-1",
+        user_service.USER_INVALIDATIONS_KEY,
+        "email:jane@example.com",
+        "google:google-1",
+        "stripe:customer:cus_new",
+        "stripe:customer:cus_old",
+    ]
+    assert args[2] == 3  # Index copies; the remaining key is deleted
+
+
+def test_patch_user_fields_moves_changed_email_index():
+    """Changing the email writes the new index copy and deletes the old one"""
+    stored_user = _make_user(stripe_customer_id=None)
+    redis = _RecordingRedis(stored_user.model_dump_json())
+
+    async def _fake_redis_operation(operation_name, operation_func, *args, **kwargs):
+        return await operation_func(redis, *args)
+
+    original_redis_operation = user_service.redis_operation
+    user_service.redis_operation = _fake_redis_operation
+    try:
+        patched = asyncio.run(user_service.patch_user_fields("user-1", {"email": "jane@example.org"}))
+    finally:
+        user_service.redis_operation = original_redis_operation
+        user_service._user_cache.clear()
+        user_service._google_id_cache.clear()
+
+    keys, args = redis.evals[0]
+    assert patched.email == "jane@example.org"
+    assert keys == [
+        "user:user-1",
+        user_service.USER_INVALIDATIONS_KEY,
+        "email:jane@example.org",
+        "google:google-1",
+        "email:jane@example.com",
+    ]
+    assert args[2] == 2
+
+
+if __name__ == "__main__":
+    test_patch_user_fields_stores_pydantic_json()
+    test_patch_user_fields_moves_changed_email_index()
+    print("All tests passed!")